@@ -0,0 +1,40 @@
+"""Benchmark the directive tokenizer on worst-case lines
+
+Prints the time per byte for lines of increasing length. For a linear
+tokenizer, the time per byte stays constant as the lines grow.
+"""
+
+import time
+
+from template_fragments._base import match_fragment_tag
+
+patterns = {
+    "unterminated tag": "a",
+    "percent in tag": "a%",
+    "only percents": "%",
+    "failing closers": "%%}",
+    "repeated openers": "{%",
+    "many words": "a ",
+}
+sizes = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def main():
+    print(f"{'pattern':20s}" + "".join(f"{size:>12,d}" for size in sizes))
+    for name, pattern in patterns.items():
+        timings = []
+        for size in sizes:
+            line = "{% " + pattern * (size // len(pattern))
+            timings.append(min(measure(line) for _ in range(5)) / len(line))
+
+        print(f"{name:20s}" + "".join(f"{1e9 * t:9.2f} ns" for t in timings))
+
+
+def measure(line):
+    start = time.perf_counter()
+    match_fragment_tag(line)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    main()
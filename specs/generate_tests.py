@@ -2,6 +2,7 @@
 # ruff: noqa: F541
 import functools as ft
 import json
+import re
 import tomli
 
 from pathlib import Path
@@ -18,7 +19,12 @@ def main():
 
         p("import pytest")
         p()
-        p("from template_fragments import split_templates, filter_template")
+        p("from template_fragments import (")
+        p("    TemplateFragmentError,")
+        p("    filter_template,")
+        p("    filter_templates,")
+        p("    split_templates,")
+        p(")")
         p()
         p()
         p("def concat(*p: str) -> str:")
@@ -68,18 +74,37 @@ def generate_test(test, *, fobj):
             )
 
         p("    assert split_templates(template) == expected")
+        p("    assert filter_templates(template, expected) == expected")
 
     else:
+        raises = (
+            f"pytest.raises(TemplateFragmentError, match={json.dumps(test['message'])})"
+        )
+
         for fragment in test["fragment"]:
-            p(f"    with pytest.raises(Exception):")
+            p(f"    with {raises}:")
             p(f"        filter_template(template, {json.dumps(fragment['name'])})")
 
-        p("    with pytest.raises(Exception):")
+        p(f"    with {raises}:")
         p("        split_templates(template)")
+        p(f"    with {raises}:")
+        p(
+            f"        filter_templates(template, "
+            f"{json.dumps(declared_fragments(test['source']))})"
+        )
 
     p()
     p()
 
 
+def declared_fragments(source):
+    """Return the root fragment and the fragments declared in the source"""
+    names = [""]
+    for m in re.finditer(r"\{%\s*fragment(?:-block)?\s+(.*?)\s*%\}", source):
+        names.extend(name for name in m.group(1).split() if name not in names)
+
+    return names
+
+
 if __name__ == "__main__":
     main()
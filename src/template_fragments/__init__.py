@@ -1,8 +1,29 @@
-from ._base import TemplateFragmentError, filter_template, split_path, split_templates
+from ._base import (
+    StaticFragment,
+    TemplateFragmentError,
+    filter_template,
+    filter_templates,
+    fragment_digests,
+    fragment_parents,
+    is_static_template,
+    minify_template,
+    replace_fragments,
+    split_path,
+    split_templates,
+)
+from ._registry import SplitRegistry
 
 __all__ = [
     "split_templates",
     "filter_template",
+    "filter_templates",
+    "fragment_digests",
+    "fragment_parents",
     "split_path",
+    "minify_template",
+    "replace_fragments",
+    "is_static_template",
+    "StaticFragment",
+    "SplitRegistry",
     "TemplateFragmentError",
 ]
@@ -0,0 +1,268 @@
+"""Command line tools
+
+Usage:
+
+```bash
+python -m template_fragments profile templates/ --sort compile_time
+python -m template_fragments export templates/ "widgets/*.html" --output static/
+```
+"""
+
+import argparse
+import csv
+import hashlib
+import importlib
+import json
+import marshal
+import pathlib
+import re
+import sys
+import time
+
+from typing import Any, Dict, List, Optional
+
+from ._base import filter_template, split_templates
+
+profile_fields = [
+    "name",
+    "bytes",
+    "lines",
+    "depth",
+    "split_time",
+    "compile_time",
+    "code_size",
+]
+
+_statement = re.compile(r"\{%[-+]?\s*(?P<tag>\w+)")
+_block_tags = {
+    "autoescape",
+    "block",
+    "call",
+    "filter",
+    "for",
+    "if",
+    "macro",
+    "raw",
+    "trans",
+    "with",
+}
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m template_fragments")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    profile_parser = subparsers.add_parser(
+        "profile", help="report size and compile time of all fragments"
+    )
+    profile_parser.add_argument("template_dir")
+    profile_parser.add_argument("--pattern", default="**/*.html")
+    profile_parser.add_argument(
+        "--environment",
+        help="the Jinja environment used for compiling, given as MODULE:ATTR",
+    )
+    profile_parser.add_argument("--no-compile", action="store_true")
+    profile_parser.add_argument("--sort", choices=profile_fields, default="name")
+    profile_parser.add_argument(
+        "--format", choices=["table", "json", "csv"], default="table"
+    )
+    profile_parser.set_defaults(func=_profile_command)
+
+    export_parser = subparsers.add_parser(
+        "export", help="write the fragments of templates into a JSON bundle"
+    )
+    export_parser.add_argument("template_dir")
+    export_parser.add_argument(
+        "templates", nargs="*", help="the exported templates, by default all"
+    )
+    export_parser.add_argument("--pattern", default="**/*.html")
+    export_parser.add_argument("--output", default=".", help="the output directory")
+    export_parser.add_argument("--prefix", default="fragments")
+    export_parser.add_argument("--minify", action="store_true")
+    export_parser.set_defaults(func=_export_command)
+
+    args = parser.parse_args(args)
+    args.func(args)
+
+
+def _profile_command(args):
+    environment = None
+    if args.environment is not None:
+        module, _, attr = args.environment.partition(":")
+        environment = getattr(importlib.import_module(module), attr)
+
+    elif not args.no_compile:
+        try:
+            import jinja2
+
+        except ImportError:
+            pass
+
+        else:
+            environment = jinja2.Environment()
+
+    records = profile_templates(args.template_dir, args.pattern, environment)
+    records = sorted(
+        records,
+        key=lambda record: record[args.sort] or 0,
+        reverse=args.sort != "name",
+    )
+
+    if args.format == "json":
+        json.dump(records, sys.stdout, indent=2)
+        print()
+
+    elif args.format == "csv":
+        writer = csv.DictWriter(sys.stdout, profile_fields, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(records)
+
+    else:
+        _print_table(records)
+
+
+def profile_templates(
+    template_dir, pattern: str = "**/*.html", environment: Any = None
+) -> List[Dict[str, Any]]:
+    """Collect size and timing information for all fragments in a directory
+
+    Each record contains the name as `template#fragment`, the size of the
+    fragment source in bytes and lines, the maximum nesting depth of block
+    statements, the time to filter the fragment and, if a Jinja `environment`
+    is given, the time to compile the fragment and the size of the compiled
+    code. Times are given in milliseconds.
+    """
+    template_dir = pathlib.Path(template_dir)
+
+    records = []
+    for path in sorted(template_dir.glob(pattern)):
+        if not path.is_file():
+            continue
+
+        template = path.relative_to(template_dir).as_posix()
+        src = path.read_text(encoding="utf-8")
+
+        for fragment, source in split_templates(src).items():
+            name = f"{template}#{fragment}" if fragment else template
+
+            start = time.perf_counter()
+            filter_template(src, fragment)
+            split_time = 1e3 * (time.perf_counter() - start)
+
+            compile_time = code_size = None
+            if environment is not None:
+                start = time.perf_counter()
+                code = environment.compile(source, name, str(path))
+                compile_time = 1e3 * (time.perf_counter() - start)
+                code_size = len(marshal.dumps(code))
+
+            records.append(
+                {
+                    "name": name,
+                    "bytes": len(source.encode("utf-8")),
+                    "lines": source.count("\n"),
+                    "depth": _nesting_depth(source),
+                    "split_time": split_time,
+                    "compile_time": compile_time,
+                    "code_size": code_size,
+                }
+            )
+
+    return records
+
+
+def _export_command(args):
+    bundle = bundle_templates(
+        args.template_dir, args.templates or None, args.pattern, minify=args.minify
+    )
+    print(write_bundle(bundle, args.output, args.prefix))
+
+
+def bundle_templates(
+    template_dir,
+    templates: Optional[List[str]] = None,
+    pattern: str = "**/*.html",
+    *,
+    minify: bool = False,
+) -> Dict[str, str]:
+    """Collect the sources of all fragments of the given templates
+
+    The result maps `template#fragment`, or the template name for the full
+    template, to the source. `templates` are given relative to
+    `template_dir`, glob patterns are supported. If `templates` is `None`, all
+    templates matching `pattern` are included.
+    """
+    template_dir = pathlib.Path(template_dir)
+
+    paths = set()
+    for item in [pattern] if templates is None else templates:
+        paths.update(path for path in template_dir.glob(item) if path.is_file())
+
+    bundle = {}
+    for path in sorted(paths):
+        template = path.relative_to(template_dir).as_posix()
+        fragments = split_templates(path.read_text(encoding="utf-8"), minify=minify)
+        for fragment, source in fragments.items():
+            bundle[f"{template}#{fragment}" if fragment else template] = source
+
+    return bundle
+
+
+def write_bundle(bundle: Dict[str, str], output_dir, prefix: str = "fragments"):
+    """Write a bundle as compact JSON to a file named after its content hash
+
+    The file is named `{prefix}.{hash}.json`, such that it can be cached
+    indefinitely. Returns the path of the written file.
+    """
+    data = json.dumps(
+        bundle, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    ).encode("utf-8")
+    digest = hashlib.blake2b(data, digest_size=8).hexdigest()
+
+    path = pathlib.Path(output_dir) / f"{prefix}.{digest}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def _nesting_depth(source: str) -> int:
+    depth = max_depth = 0
+    for m in _statement.finditer(source):
+        tag = m.group("tag")
+        if tag in _block_tags:
+            depth += 1
+            max_depth = max(depth, max_depth)
+
+        elif tag.startswith("end") and tag[3:] in _block_tags:
+            depth = max(depth - 1, 0)
+
+    return max_depth
+
+
+def _print_table(records):
+    rows = [profile_fields] + [
+        [_format_value(record[field]) for field in profile_fields] for record in records
+    ]
+    widths = [max(len(row[idx]) for row in rows) for idx in range(len(profile_fields))]
+
+    for row in rows:
+        print(
+            "  ".join(
+                value.ljust(width) if idx == 0 else value.rjust(width)
+                for idx, (value, width) in enumerate(zip(row, widths))
+            ).rstrip()
+        )
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return "-"
+
+    if isinstance(value, float):
+        return f"{value:.3f}"
+
+    return str(value)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,34 @@
+import functools
+import gzip
+import hashlib
 import re
-
-from typing import Dict, Iterable, List, Optional, Set, Tuple, TypeVar
+import zlib
+
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+)
 
 K = TypeVar("K")
 V = TypeVar("V")
 T = TypeVar("T")
 
-fragment_tag = re.compile(
-    r"(?P<head>[^\{]*)\{%\s+(?P<tag>[^\s]+)(?P<data>[^%]+)%\}(?P<tail>.*)"
-)
+# templates of at least this many characters are scanned with numpy, if it is
+# installed
+vectorize_threshold = 1 << 20
+
+whitespace = re.compile(r"\s+")
+non_whitespace = re.compile(r"\S+")
+preserved_start = re.compile(r"<(?P<tag>pre|textarea|script)\b", re.IGNORECASE)
+between_tags = re.compile(r">[ \t]{2,}<")
 
 
 def split_path(path: str) -> Tuple[str, str]:
@@ -17,7 +37,7 @@ def split_path(path: str) -> Tuple[str, str]:
     return (template, fragment) if template else (fragment, "")
 
 
-def filter_template(src: str, fragment: str = "") -> str:
+def filter_template(src: str, fragment: str = "", *, minify: bool = False) -> str:
     """Return the parts of the template for the given fragment
 
     Parameters:
@@ -25,18 +45,23 @@ def filter_template(src: str, fragment: str = "") -> str:
     - `src`: the template source
     - `fragment`: the fragment to return. If `fragment = ""`, removes any
       fragment directives
+    - `minify`: if `True`, minify the whitespace of the result, see
+      `minify_template`
     """
-    return "\n".join(
+    res = "\n".join(
         line
         for active_fragments, line in _split_impl(src)
         if fragment in active_fragments
     )
+    return minify_template(res) if minify else res
 
 
-def split_templates(src: str) -> Dict[str, str]:
+def split_templates(src: str, *, minify: bool = False) -> Dict[str, str]:
     """Return all fragments contained in the template
 
     The key `""` gives the source template with any fragment directives removed.
+    If `minify=True`, the whitespace of each fragment is minified, see
+    `minify_template`.
     """
     fragment_lines = collect(
         (fragment, line)
@@ -44,16 +69,245 @@ def split_templates(src: str) -> Dict[str, str]:
         for fragment in active_fragments
     )
 
-    return {fragment: "\n".join(lines) for fragment, lines in fragment_lines}
+    return {
+        fragment: minify_template("\n".join(lines)) if minify else "\n".join(lines)
+        for fragment, lines in fragment_lines
+    }
+
+
+def filter_templates(
+    src: str, fragments: Iterable[str], *, minify: bool = False
+) -> Dict[str, str]:
+    """Return the parts of the template for each of the given fragments
+
+    In contrast to calling `filter_template` for each fragment, the template
+    is scanned only once and, in contrast to `split_templates`, only the
+    requested fragments are collected. Unknown fragments raise a
+    `TemplateFragmentError`.
+    """
+    fragment_lines: Dict[str, List[str]] = {fragment: [] for fragment in fragments}
+    requested = fragment_lines.keys()
+
+    for active_fragments, line in _split_impl(src):
+        if requested.isdisjoint(active_fragments):
+            continue
+
+        for fragment in requested & active_fragments:
+            fragment_lines[fragment].append(line)
+
+    if missing := [fragment for fragment, lines in fragment_lines.items() if not lines]:
+        raise TemplateFragmentError(f"Unknown fragments: {', '.join(sorted(missing))}")
+
+    return {
+        fragment: minify_template("\n".join(lines)) if minify else "\n".join(lines)
+        for fragment, lines in fragment_lines.items()
+    }
+
+
+def replace_fragments(src: str, placeholders: Mapping[str, str]) -> str:
+    """Return the full template with fragments replaced by placeholders
+
+    `placeholders` maps fragment names to the text inserted instead of the
+    lines of the fragment. Fragments nested inside a replaced fragment are
+    removed together with it. Any other fragment directives are removed as
+    for `filter_template(src, "")`.
+    """
+    replaced = placeholders.keys()
+    previous: Set[str] = set()
+
+    res = []
+    for active_fragments, line in _split_impl(src):
+        if "" not in active_fragments:
+            continue
+
+        current = replaced & active_fragments
+        if not current:
+            res.append(line)
+
+        elif current.isdisjoint(previous):
+            res.extend(
+                placeholder
+                for fragment, placeholder in placeholders.items()
+                if fragment in current
+            )
+
+        previous = current
+
+    return "\n".join(res)
+
+
+def fragment_parents(src: str) -> Dict[str, Set[str]]:
+    """Return the names of the fragments enclosing each fragment
+
+    Top-level fragments map to an empty set. A fragment that occurs more than
+    once is enclosed by the fragments enclosing any of its occurrences.
+    """
+    stack: List[Set[str]] = []
+    parents: Dict[str, Set[str]] = {}
+
+    for line_idx, line in enumerate(src.split("\n")):
+        tag, _, data = parse_fragment_tag(line, line_idx)
+        if tag in {"fragment", "fragment-block"}:
+            enclosing = set(flatten(stack))
+            for fragment in sorted(data):
+                parents.setdefault(fragment, set()).update(enclosing)
+
+            stack.append(data)
+
+        elif tag in {"endfragment", "endfragment-block"} and stack:
+            stack.pop()
+
+    return parents
+
+
+def fragment_digests(src: str) -> Dict[str, str]:
+    """Return a hex digest of the source of each fragment in the template
+
+    The digests are computed in a single pass without building the fragment
+    sources. Each digest equals the digest of the corresponding source
+    returned by `split_templates` and is computed as for
+    `StaticFragment.digest`.
+    """
+    hashers: Dict[str, Any] = {}
+    for active_fragments, line in _split_impl(src):
+        data = line.encode("utf-8")
+        for fragment in active_fragments:
+            hasher = hashers.get(fragment)
+            if hasher is None:
+                hasher = hashers[fragment] = _hasher()
+                hasher.update(data)
+
+            else:
+                hasher.update(b"\n" + data)
+
+    return {fragment: hasher.hexdigest() for fragment, hasher in hashers.items()}
+
+
+def minify_template(src: str) -> str:
+    """Remove insignificant whitespace from a template
+
+    The lines are dedented to their minimum indentation, blank lines and the
+    trailing newline are removed and runs of spaces between tags are collapsed
+    into a single space. The content of `<pre>`, `<textarea>` and `<script>`
+    elements is left untouched.
+    """
+    lines = src.split("\n")
+    regions = list(_preserved_regions(lines))
+
+    indent = min(
+        (
+            len(line) - len(line.lstrip(" \t"))
+            for line, (starts_inside, _, _) in zip(lines, regions)
+            if not starts_inside and line.strip()
+        ),
+        default=0,
+    )
+
+    res = []
+    for line, (starts_inside, ends_inside, touched) in zip(lines, regions):
+        if not starts_inside:
+            if not ends_inside and not line.strip():
+                continue
+
+            line = line[indent:]
+
+        if not ends_inside:
+            line = line.rstrip()
+
+        if not touched:
+            line = between_tags.sub("> <", line)
+
+        res.append(line)
+
+    return "\n".join(res)
+
+
+def _preserved_regions(lines: Iterable[str]) -> Iterable[Tuple[bool, bool, bool]]:
+    """Yield whether each line starts inside, ends inside or touches a region"""
+    end = None
+    for line in lines:
+        starts_inside = touched = end is not None
+        pos = 0
+        while True:
+            if end is not None:
+                if (m := end.search(line, pos)) is None:
+                    break
+
+                pos, end = m.end(), None
+
+            else:
+                if (m := preserved_start.search(line, pos)) is None:
+                    break
+
+                touched = True
+                pos = m.end()
+                end = re.compile(rf"</{m.group('tag')}\s*>", re.IGNORECASE)
+
+        yield starts_inside, end is not None, touched
+
+
+def is_static_template(src: str, markers: Sequence[str] = ("{{", "{%", "{#")) -> bool:
+    """Check whether the template source contains no template syntax
+
+    `markers` are the start strings of expressions, statements and comments.
+    """
+    return not any(marker in src for marker in markers)
+
+
+class StaticFragment:
+    """The precomputed body of a fragment without template syntax
+
+    Attributes:
+
+    - `body`: the UTF-8 encoded body
+    - `digest`: a hex digest of the body
+    - `encoded`: the body compressed for each content encoding, by default
+      `"gzip"` and `"deflate"`
+    """
+
+    def __init__(self, text: str, encodings: Sequence[str] = ("gzip", "deflate")):
+        self.body = text.encode("utf-8")
+        self.digest = _hasher(self.body).hexdigest()
+        self.encoded = {
+            encoding: _compressors[encoding](self.body) for encoding in encodings
+        }
+
+    def __repr__(self):
+        return f"<StaticFragment {len(self.body)} bytes {self.digest}>"
+
+
+def _hasher(data: bytes = b""):
+    return hashlib.blake2b(data, digest_size=16)
+
+
+_compressors = {
+    "gzip": lambda body: gzip.compress(body, mtime=0),
+    "deflate": zlib.compress,
+}
 
 
 def _split_impl(src: str) -> Iterable[Tuple[Set[str], str]]:
+    """Yield the lines of the template together with their active fragments
+
+    For large templates, consecutive lines without directives may be yielded
+    as a single chunk of lines joined with newlines.
+    """
+    if len(src) >= vectorize_threshold and (vectorized := _load_vectorized()):
+        num_lines, segments = vectorized.split_segments(src)
+
+    else:
+        lines = src.split("\n")
+        num_lines, segments = len(lines), enumerate(lines)
+
     stack: List[List[str]] = []
     active_fragments: Set[str] = {""}
     seen_fragments: Set[str] = set()
 
-    line_idx = 0
-    for line_idx, line in enumerate(src.split("\n")):
+    for line_idx, line in segments:
+        if line_idx is None:
+            yield active_fragments, line
+            continue
+
         tag, head, data = parse_fragment_tag(line, line_idx)
         if tag == "fragment":
             if reentrant := data & active_fragments:
@@ -97,17 +351,30 @@ def _split_impl(src: str) -> Iterable[Tuple[Set[str], str]]:
     yield seen_fragments, ""
 
     if stack:
-        raise TemplateFragmentError(f"Unbalanced fragments in line {line_idx + 1}")
+        raise TemplateFragmentError(f"Unbalanced fragments in line {num_lines}")
+
+
+@functools.lru_cache(maxsize=None)
+def _load_vectorized():
+    # cached, such that a missing numpy is not imported again for each template
+    try:
+        from . import _vectorized
+
+    except ImportError:
+        return None
+
+    return _vectorized
 
 
 def parse_fragment_tag(s, line_idx) -> Tuple[Optional[str], Set[str]]:
-    if (m := fragment_tag.match(s)) is not None:
-        head = m.group("head")
-        if head.strip() or m.group("tail").strip():
-            raise TemplateFragmentError()
+    if (m := match_fragment_tag(s)) is not None:
+        head, tag, data, tail = m
+        if head.strip() or tail.strip():
+            raise TemplateFragmentError(
+                f"Content around a fragment tag in line {line_idx + 1}"
+            )
 
-        tag = m.group("tag")
-        data = {item.strip() for item in m.group("data").split()}
+        data = {item.strip() for item in data.split()}
 
         if tag == "fragment" and not data:
             raise TemplateFragmentError(
@@ -131,6 +398,57 @@ def parse_fragment_tag(s, line_idx) -> Tuple[Optional[str], Set[str]]:
         return None, "", []
 
 
+def match_fragment_tag(s: str) -> Optional[Tuple[str, str, str, str]]:
+    r"""Split a line into head, tag, data and tail of its directive
+
+    The result is identical to matching the regular expression
+
+    ```
+    (?P<head>[^\{]*)\{%\s+(?P<tag>[^\s]+)(?P<data>[^%]+)%\}(?P<tail>.*)
+    ```
+
+    but the runtime is linear in the length of the line, whereas the
+    backtracking regular expression is quadratic for lines such as
+    `{% aaa...`. Returns `None` if the line does not match.
+    """
+    start = s.find("{")
+    if start < 0 or not s.startswith("{%", start):
+        return None
+
+    if (m := whitespace.match(s, start + 2)) is None:
+        return None
+
+    if (m := non_whitespace.match(s, m.end())) is None:
+        return None
+
+    tag_start, tag_end = m.span()
+
+    # greedy case: the tag spans the whole run of non-whitespace characters
+    if tag_end < len(s):
+        data_end = s.find("%", tag_end)
+        if data_end >= 0 and s.startswith("}", data_end + 1):
+            return (
+                s[:start],
+                s[tag_start:tag_end],
+                s[tag_end:data_end],
+                s[data_end + 2 :],
+            )
+
+    # backtracking case: the data ends at a `%}` inside the run, the regex
+    # picks the longest tag, i.e., data consisting of a single character
+    data_end = tag_end
+    while (data_end := s.rfind("%}", tag_start, data_end + 1)) >= 0:
+        if data_end - 1 > tag_start and s[data_end - 1] != "%":
+            return (
+                s[:start],
+                s[tag_start : data_end - 1],
+                s[data_end - 1 : data_end],
+                s[data_end + 2 :],
+            )
+
+    return None
+
+
 def flatten(items: Iterable[Iterable[T]]) -> Iterable[T]:
     for item in items:
         yield from item
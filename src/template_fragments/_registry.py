@@ -0,0 +1,132 @@
+import hashlib
+import os
+import threading
+
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+from ._base import split_templates
+
+
+class SplitRegistry:
+    """A thread-safe cache of split templates shared between loaders
+
+    Templates are keyed by their resolved filename and a digest of their
+    source. Therefore, each version of a file is split once per process,
+    independent of how many loaders or environments use it. The sources are
+    kept together with their fragments. The total size of the cached sources
+    and fragments is bounded by `max_size` characters, the least recently
+    used templates are evicted first.
+
+    Usage:
+
+    ```python
+    registry = SplitRegistry()
+
+    app.jinja_loader = FragmentLoader(app.jinja_loader, registry=registry)
+    other_app.jinja_loader = FragmentLoader(other_app.jinja_loader, registry=registry)
+    ```
+    """
+
+    def __init__(self, max_size: int = 64 * 1024 * 1024):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._pending: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def split(
+        self, filename: str, source: str, *, minify: bool = False
+    ) -> Dict[str, str]:
+        """Return the fragments of the source, splitting it only if required
+
+        Concurrent requests for the same key wait for a single split.
+        """
+        key = self.key(filename, source, minify=minify)
+        return self.split_key(key, source, minify=minify)
+
+    def key(self, filename: str, source: str, *, minify: bool = False) -> Hashable:
+        """Return the key of a template source, see `get` and `split_key`"""
+        digest = hashlib.blake2b(source.encode("utf-8"), digest_size=16).digest()
+        return os.path.realpath(filename), minify, digest
+
+    def get(self, key: Hashable) -> Optional[Dict[str, str]]:
+        """Return the fragments for a key or `None` if they are not cached"""
+        entry = self.get_entry(key)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, key: Hashable) -> Optional[Tuple[Dict[str, str], str]]:
+        """Return the fragments and the source for a key or `None`"""
+        with self._lock:
+            return self._get(key)
+
+    def split_key(
+        self, key: Hashable, source: str, *, minify: bool = False
+    ) -> Dict[str, str]:
+        """Return the fragments for a key, splitting the source if required
+
+        `minify` has to match the value the key was computed with.
+        """
+        with self._lock:
+            entry = self._get(key)
+            if entry is not None:
+                return entry[0]
+
+            pending = self._pending.setdefault(key, threading.Lock())
+
+        with pending:
+            with self._lock:
+                entry = self._get(key)
+                if entry is not None:
+                    return entry[0]
+
+            try:
+                fragments = split_templates(source, minify=minify)
+
+            except BaseException:
+                with self._lock:
+                    self._pending.pop(key, None)
+
+                raise
+
+            with self._lock:
+                self._pending.pop(key, None)
+                self.misses += 1
+
+                previous = self._entries.pop(key, None)
+                if previous is not None:
+                    self.size -= _size(previous)
+
+                entry = self._entries[key] = fragments, source
+                self.size += _size(entry)
+
+                while self.size > self.max_size and len(self._entries) > 1:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.size -= _size(evicted)
+
+        return fragments
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def clear(self):
+        """Remove all templates"""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        return entry
+
+
+def _size(entry: Tuple[Dict[str, str], str]) -> int:
+    fragments, source = entry
+    return len(source) + sum(len(fragment) for fragment in fragments.values())
@@ -0,0 +1,46 @@
+"""Vectorized scanning of large templates with numpy"""
+
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+
+def split_segments(src: str) -> Tuple[int, Iterable[Tuple[Optional[int], str]]]:
+    """Split the template into lines that may contain directives and chunks
+
+    Returns the number of lines and the segments as pairs of line index and
+    text. Runs of lines without `{%` are returned as a single chunk with a
+    line index of `None`.
+    """
+    data = src.encode("utf-8")
+    buffer = np.frombuffer(data, dtype=np.uint8)
+
+    newlines = np.flatnonzero(buffer == ord("\n"))
+    starts = np.concatenate(([0], newlines + 1)).tolist()
+    ends = np.concatenate((newlines, [len(buffer)])).tolist()
+
+    openers = np.flatnonzero((buffer[:-1] == ord("{")) & (buffer[1:] == ord("%")))
+    candidates = np.unique(np.searchsorted(newlines, openers)).tolist()
+
+    # for ASCII sources, byte offsets are character offsets
+    if src.isascii():
+        text = src.__getitem__
+
+    else:
+
+        def text(span):
+            return data[span].decode("utf-8")
+
+    def segments():
+        next_line = 0
+        for line_idx in candidates:
+            if line_idx > next_line:
+                yield None, text(slice(starts[next_line], ends[line_idx - 1]))
+
+            yield line_idx, text(slice(starts[line_idx], ends[line_idx]))
+            next_line = line_idx + 1
+
+        if next_line < len(starts):
+            yield None, text(slice(starts[next_line], ends[-1]))
+
+    return len(starts), segments()
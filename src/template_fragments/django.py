@@ -0,0 +1,122 @@
+"""Django specific helpers
+
+Usage:
+
+```python
+TEMPLATES = [
+    {
+        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "DIRS": [...],
+        "OPTIONS": {
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        (
+                            "template_fragments.django.Loader",
+                            [
+                                "django.template.loaders.filesystem.Loader",
+                                "django.template.loaders.app_directories.Loader",
+                            ],
+                        ),
+                    ],
+                ),
+            ],
+        },
+    },
+]
+```
+"""
+
+from typing import Dict, List, Tuple
+
+from ._base import split_path, split_templates
+
+from django.template import Origin
+from django.template.loaders.base import Loader as BaseLoader
+
+
+class Loader(BaseLoader):
+    """A loader that wraps other Django loaders and filters fragments
+
+    Each source template is split once per source origin and the fragments are
+    reused until the contents of the origin change. Wrap the loader in
+    `django.template.loaders.cached.Loader` to also cache the compiled
+    fragment templates.
+    """
+
+    def __init__(self, engine, loaders):
+        super().__init__(engine)
+        self.loaders = engine.get_template_loaders(loaders)
+        self._index: Dict[Tuple[str, str], Tuple[str, Dict[str, str]]] = {}
+
+    def get_dirs(self):
+        for loader in self.loaders:
+            if hasattr(loader, "get_dirs"):
+                yield from loader.get_dirs()
+
+    def get_template_sources(self, template_name):
+        template, fragment = split_path(template_name)
+        for loader in self.loaders:
+            for origin in loader.get_template_sources(template):
+                yield FragmentOrigin(origin, fragment, template_name, self)
+
+    def get_contents(self, origin):
+        return self.get_fragments(origin.source_origin).get(origin.fragment, "")
+
+    def get_fragments(self, source_origin: Origin) -> Dict[str, str]:
+        """Return all fragments of the template behind the source origin"""
+        contents = source_origin.loader.get_contents(source_origin)
+
+        key = (source_origin.loader_name, source_origin.name)
+        cached = self._index.get(key)
+        if cached is not None and cached[0] == contents:
+            return cached[1]
+
+        fragments = split_templates(contents)
+        self._index[key] = (contents, fragments)
+        return fragments
+
+    def reset(self):
+        self._index.clear()
+        for loader in self.loaders:
+            loader.reset()
+
+
+class FragmentOrigin(Origin):
+    """The origin of a fragment, wrapping the origin of its source template"""
+
+    def __init__(self, source_origin: Origin, fragment: str, template_name, loader):
+        super().__init__(
+            name=f"{source_origin.name}#{fragment}" if fragment else source_origin.name,
+            template_name=template_name,
+            loader=loader,
+        )
+        self.source_origin = source_origin
+        self.fragment = fragment
+
+
+def warmup(engine, template_names) -> List[str]:
+    """Precompile the given templates and all of their fragments
+
+    `engine` can be a `django.template.Engine` or a Django templates backend.
+    Returns the names of all loaded templates. With a cached loader, later
+    renders of these fragments do not parse any source.
+    """
+    engine = getattr(engine, "engine", engine)
+
+    loaded = []
+    for template_name in template_names:
+        template = engine.get_template(template_name)
+        loaded.append(template_name)
+
+        origin = template.origin
+        if not isinstance(origin, FragmentOrigin):
+            continue
+
+        for fragment in origin.loader.get_fragments(origin.source_origin):
+            if fragment:
+                engine.get_template(f"{template_name}#{fragment}")
+                loaded.append(f"{template_name}#{fragment}")
+
+    return loaded
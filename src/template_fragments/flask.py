@@ -0,0 +1,222 @@
+"""Flask specific helpers
+
+Usage:
+
+```python
+from template_fragments.jinja import FragmentLoader
+from template_fragments.flask import render_static_fragment
+
+app.jinja_loader = FragmentLoader(app.jinja_loader)
+
+
+@app.route("/empty")
+def get_empty():
+    return render_static_fragment("index.html#empty")
+```
+
+Or use the `Fragments` extension to render only the fragment targeted by htmx
+requests, see `Fragments`.
+"""
+
+from typing import Any, Callable, Iterable, Mapping, Optional, Union
+
+from ._base import split_path
+from .jinja import (
+    FragmentLoader,
+    _combine_etag,
+    _top_level_fragments,
+    format_fragment_hashes,
+    parse_fragment_hashes,
+    render_changed_fragments,
+)
+
+from flask import Flask, Response, current_app, render_template, request
+
+
+class Fragments:
+    """A Flask extension to render the fragments targeted by htmx requests
+
+    Usage:
+
+    ```python
+    fragments = Fragments(app)
+
+
+    @app.route("/")
+    def index():
+        return fragments.render_template(
+            "index.html", targets={"item-list": "listing"}, listing=listing
+        )
+    ```
+
+    The loader of the app is wrapped in a `FragmentLoader`, keyword arguments
+    are passed on to it.
+    """
+
+    def __init__(self, app: Optional[Flask] = None, **loader_kwargs: Any):
+        self.loader_kwargs = loader_kwargs
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        """Wrap the loader of the app in a `FragmentLoader`"""
+        if not isinstance(app.jinja_loader, FragmentLoader):
+            app.jinja_loader = FragmentLoader(app.jinja_loader, **self.loader_kwargs)
+
+        app.extensions["template_fragments"] = self
+
+    def render_template(
+        self,
+        name: str,
+        targets: Optional[Mapping[str, str]] = None,
+        **context: Any,
+    ) -> Response:
+        """Render the fragment targeted by an htmx request or the full template
+
+        For requests with an `HX-Request` header, the id in the `HX-Target`
+        header is mapped to a fragment of the template, either via `targets`,
+        a dict of element id to fragment name, or by using a fragment with the
+        same name. Boosted requests, requests without a matching fragment and
+        all other requests render the full template. The response varies on
+        the htmx headers.
+        """
+        template, fragment = split_path(name)
+        if not fragment:
+            fragment = _targeted_fragment(template, targets or {})
+
+        response = current_app.make_response(
+            render_template(
+                f"{template}#{fragment}" if fragment else template, **context
+            )
+        )
+        response.vary.update(["HX-Request", "HX-Target"])
+        return response
+
+
+def _targeted_fragment(template: str, targets: Mapping[str, str]) -> str:
+    if request.headers.get("HX-Request") != "true":
+        return ""
+
+    if request.headers.get("HX-Boosted") == "true":
+        return ""
+
+    target = request.headers.get("HX-Target", "").lstrip("#")
+    if not target:
+        return ""
+
+    fragment = targets.get(target, target)
+    fragments, _, _ = _get_fragment_loader().get_fragments(
+        current_app.jinja_env, template
+    )
+    return fragment if fragment in fragments else ""
+
+
+def render_static_fragment(name: str) -> Response:
+    """Serve a fragment without template syntax without rendering it
+
+    The precomputed body is sent in the best content encoding accepted by the
+    client together with an ETag. Fragments that are not static are rendered
+    with `flask.render_template` without any context.
+    """
+    static = _get_fragment_loader().get_static(current_app.jinja_env, name)
+    if static is None:
+        return current_app.make_response(render_template(name))
+
+    encoding = request.accept_encodings.best_match(list(static.encoded))
+
+    response = Response(
+        static.encoded[encoding] if encoding is not None else static.body,
+        mimetype="text/html",
+    )
+    if encoding is not None:
+        response.content_encoding = encoding
+
+    response.vary.add("Accept-Encoding")
+    response.set_etag(static.digest)
+    return response
+
+
+def render_conditional(
+    name: str,
+    version: Any = "",
+    context: Union[Mapping[str, Any], Callable[[], Mapping[str, Any]], None] = None,
+) -> Response:
+    """Render a template or fragment unless the client has an up to date copy
+
+    The ETag combines the digest of the fragment source and of the templates
+    it extends, includes or imports with the `version` of the data, see
+    `template_fragments.jinja.fragment_etag`. Templates referenced by dynamic
+    names are not part of the digest, they have to be covered by `version`.
+    If the ETag matches the `If-None-Match` header, an empty `304 Not
+    Modified` response is returned without compiling or rendering the
+    template. `context` can be given as a callable that is only called, if the
+    template is rendered.
+
+    Usage:
+
+    ```python
+    @app.route("/items/<int:item_id>")
+    def get_item(item_id):
+        return render_conditional(
+            "page.html#item",
+            version=get_item_version(item_id),
+            context=lambda: {"item": get_item(item_id)},
+        )
+    ```
+    """
+    etag = _combine_etag(
+        _get_fragment_loader().digest(current_app.jinja_env, name), version
+    )
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+
+    else:
+        if callable(context):
+            context = context()
+
+        response = current_app.make_response(render_template(name, **(context or {})))
+
+    response.set_etag(etag)
+    return response
+
+
+def render_fragment_diff(
+    name: str,
+    fragments: Optional[Iterable[str]] = None,
+    targets: Optional[Mapping[str, str]] = None,
+    **context: Any,
+) -> Response:
+    """Render only the fragments whose output changed since the last request
+
+    The client sends the hashes of its fragments in the `X-Fragment-Hashes`
+    header and receives the changed fragments as htmx out-of-band swaps
+    together with the new hashes in the same header. By default, all
+    top-level fragments are compared. The context is updated with the
+    context processors of the app. See
+    `template_fragments.jinja.render_changed_fragments`.
+    """
+    if fragments is None:
+        fragments = _top_level_fragments(
+            _get_fragment_loader(), current_app.jinja_env, name
+        )
+
+    current_app.update_template_context(context)
+    body, hashes = render_changed_fragments(
+        current_app.jinja_env,
+        name,
+        context,
+        parse_fragment_hashes(request.headers.get("X-Fragment-Hashes", "")),
+        fragments=fragments,
+        targets=targets,
+    )
+    response = current_app.make_response(body)
+    response.headers["X-Fragment-Hashes"] = format_fragment_hashes(hashes)
+    response.vary.add("X-Fragment-Hashes")
+    return response
+
+
+def _get_fragment_loader() -> FragmentLoader:
+    if not isinstance(current_app.jinja_loader, FragmentLoader):
+        raise TypeError("The app does not use a FragmentLoader")
+
+    return current_app.jinja_loader
@@ -1,17 +1,1793 @@
 """Jinja specific helpers"""
-from ._base import filter_template, split_path
+
+import asyncio
+import collections.abc
+import functools
+import inspect
+import itertools
+import json
+import logging
+import os
+import pathlib
+import re
+import threading
+import time
+import weakref
+
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+from ._base import (
+    StaticFragment,
+    TemplateFragmentError,
+    _hasher,
+    fragment_parents,
+    is_static_template,
+    minify_template,
+    replace_fragments,
+    split_path,
+    split_templates,
+)
+from ._registry import SplitRegistry
 
 import jinja2
+import jinja2.meta
+import markupsafe
+
+if TYPE_CHECKING:
+    # imported for annotations only, to not load sqlite3 for all users
+    from .sqlite import FragmentStore
+
+_logger = logging.getLogger("template_fragments")
+
+_newline = re.compile(r"\r\n|\r|\n")
+_block_tag = re.compile(r"\{%[-+]?\s*(?P<tag>block|endblock)\b(?P<name>[^%]*)")
+
+_Fragments = Tuple[Dict[str, str], Optional[str], Optional[Callable[[], bool]]]
+_Loaded = Tuple[
+    Optional[Dict[str, str]],
+    Optional[str],
+    Optional[Callable[[], bool]],
+    Optional[Hashable],
+    int,
+    Optional[str],
+]
 
 
 class FragmentLoader(jinja2.BaseLoader):
-    """A loader that filters fragments"""
+    """A loader that filters fragments
+
+    The source of each template is split once and its fragments are reused as
+    long as the template is up to date. At most `cache_size` split templates
+    are kept, the least recently used are evicted first. Templates for which
+    the base loader does not return an `uptodate` function are loaded again
+    on every request.
+
+    With `inline_includes=True`, include statements with a literal
+    `template#fragment` target, as in `{% include "parts.html#row" %}`, are
+    replaced by the source of the fragment when the template is loaded. The
+    result is compiled into a single template without runtime lookups.
+    Dynamic targets, targets that cannot be found, includes that would form a
+    cycle, e.g., for recursive rendering, and fragments that contain `block`
+    or `extends` statements are left alone.
+
+    With `minify=True`, the whitespace of all fragments is minified, see
+    `template_fragments.minify_template`.
+
+    Pass a `template_fragments.SplitRegistry` as `registry` to share split
+    templates with other loaders. The loader then keeps only the keys of the
+    registry, templates evicted from the registry are split again when used.
+
+    With `speculative_workers` greater than zero, loading a base template
+    queues the compilation of all its fragments in a thread pool of the given
+    size. Subsequent loads of these fragments use the compiled code. See
+    `queue_depth` and `speculative_hit_rate`. If the loader is wrapped by the
+    loader of the environment, as in Flask, the compiled fragments are added
+    to the template cache of the environment instead and the hit rate is not
+    tracked.
+    """
 
-    def __init__(self, base_loader: jinja2.BaseLoader):
+    def __init__(
+        self,
+        base_loader: jinja2.BaseLoader,
+        *,
+        inline_includes: bool = False,
+        minify: bool = False,
+        registry: Optional[SplitRegistry] = None,
+        speculative_workers: int = 0,
+        cache_size: int = 400,
+    ):
         super().__init__()
         self.base_loader = base_loader
+        self.cache_size = cache_size
+        self.inline_includes = inline_includes
+        self.minify = minify
+        self.registry = registry
+        self.speculative_workers = speculative_workers
+        self.speculative_hits = 0
+        self.speculative_misses = 0
+        # the side caches are keyed by the version of the split template they
+        # were computed for, a new version is assigned whenever it changes
+        self._fragments: "OrderedDict[str, _Loaded]" = OrderedDict()
+        self._versions = itertools.count()
+        self._dependencies: Dict[str, Tuple[int, Dict[str, Set[str]]]] = {}
+        self._static: Dict[str, Tuple[int, Dict[str, StaticFragment]]] = {}
+        self._digests: Dict[str, Tuple[int, Dict[str, str]]] = {}
+        self._blocks: Dict[str, Tuple[int, Set[str]]] = {}
+        self._parents: Dict[str, Tuple[int, Dict[str, Set[str]]]] = {}
+        self._shells: Dict[str, Tuple[int, Dict[Tuple[str, ...], Any]]] = {}
+        self._compiled: Dict[str, Tuple[int, Any, Any]] = {}
+        self._speculated: Dict[str, int] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queue_depth = 0
+        self._lock = threading.Lock()
+
+    def load(
+        self,
+        environment: jinja2.Environment,
+        name: str,
+        globals: Optional[MutableMapping[str, Any]] = None,
+    ) -> jinja2.Template:
+        if not self.speculative_workers:
+            return super().load(environment, name, globals)
+
+        template, fragment = split_path(name)
+        if not fragment:
+            res = super().load(environment, name, globals)
+            self._speculate(environment, template)
+            return res
+
+        with self._lock:
+            compiled = self._compiled.pop(name, None)
+
+        cached = self._fragments.get(template)
+        if (
+            compiled is None
+            or cached is None
+            or cached[4] != compiled[0]
+            or not self.has_fragments(template)
+        ):
+            with self._lock:
+                self.speculative_misses += 1
+
+            return super().load(environment, name, globals)
+
+        with self._lock:
+            self.speculative_hits += 1
+
+        _, code, uptodate = compiled
+        return environment.template_class.from_code(
+            environment, code, globals, uptodate
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        """The number of speculative compilations that did not finish yet"""
+        return self._queue_depth
+
+    @property
+    def speculative_hit_rate(self) -> float:
+        """The share of fragment loads served by a speculative compilation"""
+        total = self.speculative_hits + self.speculative_misses
+        return self.speculative_hits / total if total else 0.0
+
+    def _speculate(self, environment, template):
+        cached = self._fragments.get(template)
+        if cached is None:
+            return
+
+        version = cached[4]
+        fragments = cached[0] if cached[3] is None else self.registry.get(cached[3])
+        if fragments is None:
+            return
+
+        with self._lock:
+            if self._speculated.get(template) == version:
+                return
+
+            self._speculated[template] = version
+            self._drop_compiled(template, version)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.speculative_workers,
+                    thread_name_prefix="template-fragments-compile",
+                )
+
+            for fragment in fragments:
+                if not fragment:
+                    continue
+
+                self._queue_depth += 1
+                future = self._executor.submit(
+                    self._compile, environment, template, fragment, version
+                )
+                future.add_done_callback(self._compile_done)
+
+    def _compile(self, environment, template, fragment, version):
+        name = f"{template}#{fragment}"
+        source, filename, uptodate = self.get_source(environment, name)
+        code = environment.compile(source, name, filename)
+
+        if environment.loader is not self:
+            # a wrapping loader never calls load, the compiled template is
+            # served from the template cache of the environment
+            compiled = environment.template_class.from_code(
+                environment, code, environment.make_globals(None), uptodate
+            )
+            key = (weakref.ref(environment.loader), name)
+            with self._lock:
+                if self._speculated.get(template) == version and (
+                    key not in environment.cache
+                ):
+                    environment.cache[key] = compiled
+
+            return
+
+        with self._lock:
+            if self._speculated.get(template) == version:
+                self._compiled[name] = version, code, uptodate
+
+    def _drop_compiled(self, template, version=None):
+        prefix = f"{template}#"
+        stale = [
+            name
+            for name, compiled in self._compiled.items()
+            if name.startswith(prefix) and compiled[0] != version
+        ]
+        for name in stale:
+            del self._compiled[name]
+
+    def _compile_done(self, future):
+        with self._lock:
+            self._queue_depth -= 1
 
     def get_source(self, environment: jinja2.Environment, path: str):
         template, fragment = split_path(path)
+        fragments, filename, uptodate = self.get_fragments(environment, template)
+        source = fragments.get(fragment, "")
+
+        if (
+            self.speculative_workers
+            and not fragment
+            and environment.loader is not self
+            and environment.cache is not None
+        ):
+            self._speculate(environment, template)
+
+        if self.inline_includes:
+            uptodates = [uptodate]
+            source = self._inline(
+                environment, source, [(template, fragment)], uptodates
+            )
+            uptodate = _all_uptodate(uptodates)
+
+        return source, filename, uptodate
+
+    def get_fragments(
+        self, environment: jinja2.Environment, template: str
+    ) -> _Fragments:
+        """Return all fragments of the template, its filename and uptodate
+
+        The fragments are given as a dict of fragment name to source.
+        """
+        fragments, filename, uptodate, _, _ = self._load(environment, template)
+        return fragments, filename, uptodate
+
+    def _load(self, environment, template):
+        cached = self._fragments.get(template)
+        if cached is not None and _is_uptodate(cached[2]):
+            if cached[3] is None:
+                entry = cached[0], cached[5]
+
+            else:
+                entry = self.registry.get_entry(cached[3])
+
+            if entry is not None:
+                with self._lock:
+                    if template in self._fragments:
+                        self._fragments.move_to_end(template)
+
+                return entry[0], cached[1], cached[2], cached[4], entry[1]
+
         source, filename, uptodate = self.base_loader.get_source(environment, template)
-        return filter_template(source, fragment), filename, uptodate
+        if self.registry is not None and filename is not None:
+            key = self.registry.key(filename, source, minify=self.minify)
+            fragments = self.registry.split_key(key, source, minify=self.minify)
+            entry_fragments = entry_source = None
+
+        else:
+            key = None
+            fragments = entry_fragments = split_templates(source, minify=self.minify)
+            entry_source = source
+
+        with self._lock:
+            # a template split again after its eviction from the registry
+            # keeps its version if the source did not change
+            if cached is not None and key is not None and cached[3] == key:
+                version = cached[4]
+
+            else:
+                version = next(self._versions)
+
+            self._fragments[template] = (
+                entry_fragments,
+                filename,
+                uptodate,
+                key,
+                version,
+                entry_source,
+            )
+            self._fragments.move_to_end(template)
+
+            while len(self._fragments) > self.cache_size:
+                evicted, _ = self._fragments.popitem(last=False)
+                self._forget(evicted)
+
+        return fragments, filename, uptodate, version, source
+
+    def _forget(self, template):
+        for cache in [
+            self._dependencies,
+            self._static,
+            self._digests,
+            self._blocks,
+            self._parents,
+            self._shells,
+            self._speculated,
+        ]:
+            cache.pop(template, None)
+
+        self._drop_compiled(template)
+
+    async def prefetch(
+        self,
+        environment: jinja2.Environment,
+        templates: Iterable[str],
+        *,
+        concurrency: int = 8,
+        executor: Optional[Executor] = None,
+    ) -> List[str]:
+        """Load and split many templates concurrently
+
+        At most `concurrency` templates are loaded at the same time. Loading
+        and splitting runs in `executor`, by default the executor of the event
+        loop. Later calls of `get_source` are served from memory. Templates
+        that are already split or cannot be found are skipped. Returns the
+        names of the loaded templates.
+
+        Usage:
+
+        ```python
+        await env.loader.prefetch(env, ["page.html", "parts.html#row"])
+        ```
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(template):
+            async with semaphore:
+                try:
+                    await loop.run_in_executor(
+                        executor, self.get_fragments, environment, template
+                    )
+
+                except jinja2.TemplateNotFound:
+                    return None
+
+            return template
+
+        pending = [
+            template
+            for template in dict.fromkeys(split_path(name)[0] for name in templates)
+            if not self.has_fragments(template)
+        ]
+        results = await asyncio.gather(*(fetch(template) for template in pending))
+        return [template for template in results if template is not None]
+
+    def has_fragments(self, template: str) -> bool:
+        """Check whether the fragments of the template are split and up to date"""
+        cached = self._fragments.get(template)
+        return (
+            cached is not None
+            and (cached[3] is None or cached[3] in self.registry)
+            and _is_uptodate(cached[2])
+        )
+
+    def get_static(
+        self, environment: jinja2.Environment, path: str
+    ) -> Optional[StaticFragment]:
+        """Return the precomputed body of a fragment without template syntax
+
+        Returns `None` if the fragment contains any expression, statement or
+        comment. See `get_static_fragments`.
+        """
+        template, fragment = split_path(path)
+        return self.get_static_fragments(environment, template).get(fragment)
+
+    def get_static_fragments(
+        self, environment: jinja2.Environment, template: str
+    ) -> Dict[str, StaticFragment]:
+        """Return all fragments of the template without template syntax
+
+        The body of each static fragment is the output rendering it with the
+        environment would produce. The result is cached until the source of
+        the template changes.
+        """
+        fragments, _, _, version, _ = self._load(environment, template)
+
+        cached = self._static.get(template)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        markers = [
+            environment.block_start_string,
+            environment.variable_start_string,
+            environment.comment_start_string,
+            environment.line_statement_prefix,
+            environment.line_comment_prefix,
+        ]
+        markers = [marker for marker in markers if marker]
+
+        static = {}
+        for fragment, source in fragments.items():
+            if not is_static_template(source, markers):
+                continue
+
+            if not environment.keep_trailing_newline and source.endswith("\n"):
+                source = source[:-1]
+
+            source = _newline.sub(environment.newline_sequence, source)
+            static[fragment] = StaticFragment(source)
+
+        self._static[template] = version, static
+        return static
+
+    def digest(self, environment: jinja2.Environment, path: str) -> str:
+        """Return a hex digest of the source of a template or fragment
+
+        The digest also changes whenever a template it extends, includes or
+        imports changes, as long as the name of that template is a literal
+        string, see `jinja2.meta.find_referenced_templates`. Templates
+        referenced by dynamic names are not covered. The digest of each source
+        is cached until its template changes.
+        """
+        return self._digest(environment, path, [])
+
+    def _digest(self, environment, path, stack):
+        template, fragment = split_path(path)
+        fragments, _, _, version, _ = self._load(environment, template)
+
+        cached = self._digests.get(template)
+        if cached is None or cached[0] != version:
+            cached = self._digests[template] = version, {}
+
+        entry = cached[1].get(fragment)
+        if entry is None:
+            source = fragments.get(fragment, "")
+            entry = cached[1][fragment] = (
+                _hasher(source.encode("utf-8")).hexdigest(),
+                _referenced_templates(environment, source, template),
+            )
+
+        digest, references = entry
+        if not references:
+            return digest
+
+        stack = [*stack, path]
+        hasher = _hasher(digest.encode("utf-8"))
+        for reference in references:
+            if reference in stack:
+                continue
+
+            try:
+                hasher.update(self._digest(environment, reference, stack).encode())
+
+            except jinja2.TemplateNotFound:
+                hasher.update(b"-")
+
+        return hasher.hexdigest()
+
+    def _inline(self, environment, source, stack, uptodates) -> str:
+        include, unsupported = _include_patterns(
+            environment.block_start_string, environment.block_end_string
+        )
+        first_line_indent = re.compile(
+            rf"^[^\S\n]+(?=(?:{re.escape(environment.block_start_string)}"
+            rf"|{re.escape(environment.comment_start_string)})(?!\+))"
+        )
+
+        def replace(m):
+            target = split_path(m.group("target"))
+            if target in stack:
+                return m.group(0)
+
+            try:
+                fragments, _, uptodate = self.get_fragments(environment, target[0])
+
+            except jinja2.TemplateNotFound:
+                return m.group(0)
+
+            target_source = fragments.get(target[1], "")
+            if unsupported.search(target_source):
+                return m.group(0)
+
+            uptodates.append(uptodate)
+            target_source = self._inline(
+                environment, target_source, [*stack, target], uptodates
+            )
+            if not environment.keep_trailing_newline and target_source.endswith("\n"):
+                target_source = target_source[:-1]
+
+            # the first line no longer starts a line once inlined, strip it as
+            # lstrip_blocks would at the start of the included template
+            if environment.lstrip_blocks:
+                target_source = first_line_indent.sub("", target_source, count=1)
+
+            # a with block scopes assignments as an include would, the `+`
+            # modifiers keep trim_blocks and lstrip_blocks from changing the
+            # inlined source
+            start, end = environment.block_start_string, environment.block_end_string
+            return (
+                f"{start}{m.group('lstrip')} with +{end}"
+                f"{target_source}"
+                f"{start}+ endwith {m.group('rstrip')}{end}"
+            )
+
+        return include.sub(replace, source)
+
+    def get_fragment_blocks(
+        self, environment: jinja2.Environment, template: str
+    ) -> Set[str]:
+        """Return the fragments of the template that consist of a single block
+
+        These are the fragments defined with `fragment-block`. They can be
+        rendered with the block of the template, see `render_fragment`.
+        """
+        fragments, _, _, version, _ = self._load(environment, template)
+
+        cached = self._blocks.get(template)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        blocks = {
+            fragment
+            for fragment, source in fragments.items()
+            if fragment and _is_single_block(source, fragment)
+        }
+        self._blocks[template] = version, blocks
+        return blocks
+
+    def get_fragment_parents(
+        self, environment: jinja2.Environment, template: str
+    ) -> Dict[str, Set[str]]:
+        """Return the names of the fragments enclosing each fragment
+
+        The result is cached until the source of the template changes. See
+        `template_fragments.fragment_parents`.
+        """
+        _, _, _, version, source = self._load(environment, template)
+
+        cached = self._parents.get(template)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        parents = fragment_parents(source)
+        self._parents[template] = version, parents
+        return parents
+
+    def get_shell(
+        self, environment: jinja2.Environment, template: str, fragments: Sequence[str]
+    ) -> Tuple[jinja2.Template, Set[str]]:
+        """Return the template with fragments replaced by placeholders
+
+        Each fragment is replaced by an empty `<template>` element with a
+        `data-fragment-placeholder` attribute. Also returns the undeclared
+        variables of the result. The compiled template is cached until the
+        template changes. See `stream_fragments`.
+        """
+        _, filename, uptodate, version, src = self._load(environment, template)
+        key = tuple(fragments)
+
+        cached = self._shells.get(template)
+        if cached is None or cached[0] != version:
+            cached = self._shells[template] = version, {}
+
+        shell = cached[1].get(key)
+        if shell is not None:
+            return shell
+
+        source = replace_fragments(
+            src, {fragment: _placeholder(fragment) for fragment in fragments}
+        )
+        if self.minify:
+            source = minify_template(source)
+
+        if self.inline_includes:
+            source = self._inline(environment, source, [(template, "")], [])
+
+        dependencies = (
+            jinja2.meta.find_undeclared_variables(environment.parse(source))
+            - environment.globals.keys()
+        )
+        compiled = environment.template_class.from_code(
+            environment,
+            environment.compile(source, template, filename),
+            environment.make_globals(None),
+            uptodate,
+        )
+        shell = cached[1][key] = compiled, dependencies
+        return shell
+
+    def get_dependencies(
+        self, environment: jinja2.Environment, template: str
+    ) -> Dict[str, Set[str]]:
+        """Return the undeclared variables referenced by each fragment
+
+        The result is cached until the source of the template changes. See
+        `fragment_dependencies`.
+        """
+        fragments, _, _, version, _ = self._load(environment, template)
+
+        cached = self._dependencies.get(template)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        dependencies = {
+            fragment: jinja2.meta.find_undeclared_variables(environment.parse(source))
+            - environment.globals.keys()
+            for fragment, source in fragments.items()
+        }
+        self._dependencies[template] = version, dependencies
+        return dependencies
+
+
+class _ProfiledCache:
+    """A template cache that records each lookup in a `UsageProfile`
+
+    Without a cache, lookups are recorded but no templates are stored.
+    """
+
+    def __init__(self, cache, profile: "UsageProfile"):
+        self.cache = cache
+        self.profile = profile
+
+    def get(self, key, default=None):
+        self.profile.record(key[1])
+        return default if self.cache is None else self.cache.get(key, default)
+
+    def clear(self):
+        if self.cache is not None:
+            self.cache.clear()
+
+    def __getattr__(self, name):
+        return getattr(self.cache, name)
+
+    def __getitem__(self, key):
+        if self.cache is None:
+            raise KeyError(key)
+
+        return self.cache[key]
+
+    def __setitem__(self, key, value):
+        if self.cache is not None:
+            self.cache[key] = value
+
+    def __delitem__(self, key):
+        if self.cache is None:
+            raise KeyError(key)
+
+        del self.cache[key]
+
+    def __contains__(self, key):
+        return self.cache is not None and key in self.cache
+
+    def __iter__(self):
+        return iter(() if self.cache is None else self.cache)
+
+    def __len__(self):
+        return 0 if self.cache is None else len(self.cache)
+
+
+class FragmentStoreLoader(jinja2.BaseLoader):
+    """A loader that serves fragments from a `FragmentStore`
+
+    Each load is a single indexed read. A template is up to date as long as
+    its version in the store is unchanged.
+    """
+
+    def __init__(self, store: "FragmentStore"):
+        super().__init__()
+        self.store = store
+
+    def get_source(self, environment: jinja2.Environment, path: str):
+        template, fragment = split_path(path)
+        res = self.store.get(template, fragment)
+        if res is None:
+            raise jinja2.TemplateNotFound(path)
+
+        source, version = res
+        return source, None, lambda: self.store.version(template) == version
+
+    def list_templates(self):
+        return self.store.list_templates()
+
+
+def _is_single_block(source: str, name: str) -> bool:
+    depth = 0
+    for m in _block_tag.finditer(source):
+        if m.group("tag") == "block":
+            if depth == 0 and (
+                source[: m.start()].strip() or m.group("name").strip() != name
+            ):
+                return False
+
+            depth += 1
+
+        else:
+            depth -= 1
+            if depth == 0:
+                return not source[m.end() :].partition("}")[2].strip()
+
+    return False
+
+
+@functools.lru_cache()
+def _include_patterns(
+    block_start: str, block_end: str
+) -> Tuple[re.Pattern, re.Pattern]:
+    start, end = re.escape(block_start), re.escape(block_end)
+    include = re.compile(
+        rf"{start}(?P<lstrip>[-+]?)\s*include\s+"
+        r"(?P<quote>[\"'])(?P<target>[^\"'#]+#[^\"'#]+)(?P=quote)"
+        rf"(?:\s+with\s+context)?\s*(?P<rstrip>[-+]?){end}"
+    )
+    unsupported = re.compile(rf"{start}[-+]?\s*(?:block|extends)\b")
+    return include, unsupported
+
+
+def _referenced_templates(
+    environment: jinja2.Environment, source: str, parent: str
+) -> Tuple[str, ...]:
+    try:
+        ast = environment.parse(source)
+
+    except jinja2.TemplateSyntaxError:
+        return ()
+
+    return tuple(
+        dict.fromkeys(
+            environment.join_path(reference, parent)
+            for reference in jinja2.meta.find_referenced_templates(ast)
+            if reference is not None
+        )
+    )
+
+
+def _is_uptodate(uptodate: Optional[Callable[[], bool]]) -> bool:
+    return uptodate is not None and uptodate()
+
+
+def _all_uptodate(uptodates: List[Optional[Callable[[], bool]]]):
+    uptodates = [uptodate for uptodate in uptodates if uptodate is not None]
+    if len(uptodates) <= 1:
+        return uptodates[0] if uptodates else None
+
+    return lambda: all(uptodate() for uptodate in uptodates)
+
+
+def fragment_dependencies(
+    environment: jinja2.Environment, template: str
+) -> Dict[str, Set[str]]:
+    """Return the context variables each fragment of the template references
+
+    Usage:
+
+    ```python
+    fragment_dependencies(env, "page.html")
+    # {"": {"items", "user"}, "item": {"item"}}
+    ```
+
+    Names of environment globals are not included. Variables referenced by
+    included or imported templates are not tracked. The environment has to
+    use a `FragmentLoader`.
+    """
+    return _get_fragment_loader(environment).get_dependencies(environment, template)
+
+
+def fragment_etag(environment: jinja2.Environment, name: str, version: Any = "") -> str:
+    """Return an ETag for a template or fragment and a version of its data
+
+    The ETag combines the digest of the source and of the templates it
+    references, see `FragmentLoader.digest`, with the application supplied
+    `version`. Computing it does not compile or render the template. The
+    environment has to use a `FragmentLoader`.
+    """
+    digest = _get_fragment_loader(environment).digest(environment, name)
+    return _combine_etag(digest, version)
+
+
+def _combine_etag(digest: str, version: Any) -> str:
+    return _hasher(f"{digest}:{version}".encode("utf-8")).hexdigest()
+
+
+def lazy_context(
+    environment: jinja2.Environment, name: str, **factories: Callable[[], Any]
+) -> Dict[str, Any]:
+    """Build the context for a template or fragment from factories
+
+    Only the factories for variables referenced by the fragment are called.
+
+    Usage:
+
+    ```python
+    context = lazy_context(env, "page.html#item", item=lambda: get_item(item_id))
+    env.get_template("page.html#item").render(context)
+    ```
+    """
+    template, fragment = split_path(name)
+    dependencies = fragment_dependencies(environment, template).get(fragment, set())
+
+    return {key: factory() for key, factory in factories.items() if key in dependencies}
+
+
+def render_fragment(
+    environment: jinja2.Environment,
+    name: str,
+    context: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Render a template or fragment, using the blocks of the template if possible
+
+    Fragments defined with `fragment-block` are rendered with the compiled
+    block of the full template and a fresh context, so they are not compiled
+    separately. The output does not contain the indentation of the
+    `fragment-block` tag. All other fragments and environments with
+    `enable_async=True` are rendered with `environment.get_template`.
+    """
+    context = {} if context is None else context
+    template, fragment = split_path(name)
+
+    if fragment and not environment.is_async:
+        loader = _get_fragment_loader(environment)
+        if fragment in loader.get_fragment_blocks(environment, template):
+            parent = environment.get_template(template)
+            block = parent.blocks.get(fragment)
+            if block is not None:
+                try:
+                    return environment.concat(block(parent.new_context(context)))
+
+                except Exception:
+                    environment.handle_exception()
+
+    return environment.get_template(name).render(context)
+
+
+async def stream_fragments(
+    environment: jinja2.Environment,
+    template: str,
+    context: Optional[Dict[str, Any]] = None,
+    *,
+    fragments: Optional[Sequence[str]] = None,
+) -> AsyncIterator[str]:
+    """Stream a page first and fill in its fragments once their data is ready
+
+    Usage:
+
+    ```python
+    stream = stream_fragments(
+        env, "page.html", {"user": user, "sidebar": load_sidebar()}
+    )
+    ```
+
+    Context values can be awaitables, e.g., coroutines or futures, which are
+    awaited concurrently. By default, all fragments that reference an
+    awaitable and are not nested in another such fragment are deferred.
+    Explicitly given `fragments` must not be nested in one another, otherwise
+    a `TemplateFragmentError` is raised. The page is sent first with an empty
+    `<template>` placeholder for each deferred fragment and only awaits the
+    values it references itself. Then each fragment is sent as soon as its
+    values are available as a `<template>` element followed by a script that
+    swaps it into its placeholder.
+    """
+    context = {} if context is None else context
+    loader = _get_fragment_loader(environment)
+    loop = asyncio.get_running_loop()
+
+    if not loader.has_fragments(template):
+        await loop.run_in_executor(None, loader.get_fragments, environment, template)
+
+    dependencies = loader.get_dependencies(environment, template)
+    parents = loader.get_fragment_parents(environment, template)
+    pending = {key for key, value in context.items() if inspect.isawaitable(value)}
+    if fragments is None:
+        deferred = {
+            fragment
+            for fragment, names in dependencies.items()
+            if fragment and not names.isdisjoint(pending)
+        }
+        fragments = [
+            fragment
+            for fragment in dependencies
+            if fragment in deferred
+            and parents.get(fragment, set()).isdisjoint(deferred)
+        ]
+
+    else:
+        nested = [
+            fragment
+            for fragment in fragments
+            if not parents.get(fragment, set()).isdisjoint(fragments)
+        ]
+        if nested:
+            raise TemplateFragmentError(
+                f"Nested fragments cannot be streamed: {nested}"
+            )
+
+    shell, shell_dependencies = loader.get_shell(environment, template, fragments)
+    futures = {key: asyncio.ensure_future(context[key]) for key in pending}
+    resolved = {key: value for key, value in context.items() if key not in pending}
+
+    async def render(template, keys):
+        keys = sorted(keys & pending)
+        values = await asyncio.gather(*(futures[key] for key in keys))
+        template_context = {**resolved, **dict(zip(keys, values))}
+        if environment.is_async:
+            return await template.render_async(template_context)
+
+        return template.render(template_context)
+
+    async def render_deferred(fragment):
+        name = f"{template}#{fragment}"
+        output = await render(
+            environment.get_template(name), dependencies.get(fragment, set())
+        )
+        return fragment, output
+
+    try:
+        yield await render(shell, shell_dependencies)
+        if fragments:
+            yield _swap_script
+
+        for task in asyncio.as_completed(
+            [render_deferred(fragment) for fragment in fragments]
+        ):
+            fragment, output = await task
+            yield (
+                f'<template data-fragment="{markupsafe.escape(fragment)}">'
+                f"{output}</template>"
+                f"<script>__swapFragment({_script_string(fragment)})</script>"
+            )
+
+    finally:
+        for future in futures.values():
+            future.cancel()
+
+
+_swap_script = (
+    "<script>function __swapFragment(name) {"
+    "var value = '=\"' + CSS.escape(name) + '\"]';"
+    "var placeholder = document.querySelector('[data-fragment-placeholder' + value);"
+    "var content = document.querySelector('template[data-fragment' + value);"
+    "placeholder.replaceWith(content.content);"
+    "content.remove();"
+    "}</script>"
+)
+
+
+def _script_string(value: str) -> str:
+    return json.dumps(value).replace("<", "\\u003c")
+
+
+def _placeholder(fragment: str) -> str:
+    return (
+        f'<template data-fragment-placeholder="{markupsafe.escape(fragment)}">'
+        "</template>"
+    )
+
+
+def render_fragments_parallel(
+    environment_factory: Callable[[], jinja2.Environment],
+    template: str,
+    fragments: Sequence[str],
+    context: Optional[Dict[str, Any]] = None,
+    *,
+    executor: Optional[ProcessPoolExecutor] = None,
+    min_jobs: int = 4,
+) -> str:
+    """Render independent fragments of a template in a process pool
+
+    Usage:
+
+    ```python
+    def make_environment():
+        return jinja2.Environment(loader=FragmentLoader(FileSystemLoader("templates")))
+
+    report = render_fragments_parallel(
+        make_environment, "report.html", ["sales", "costs", "forecast"], context
+    )
+    ```
+
+    `environment_factory` has to be picklable, e.g., a module level function,
+    and return an environment with a `FragmentLoader`. Each worker creates its
+    environment once. Each fragment only receives the context variables it
+    references, see `fragment_dependencies`, which have to be picklable.
+    Fragments that include, import or extend other templates receive the full
+    context, as these templates may reference any variable. The outputs are
+    joined with newlines in the order of `fragments`.
+
+    Without an `executor`, a process pool shared by all calls with the same
+    factory is used. With fewer than `min_jobs` fragments, the fragments are
+    rendered in the current process.
+    """
+    context = {} if context is None else context
+    environment = _factory_environment(environment_factory)
+    dependencies = fragment_dependencies(environment, template)
+    sources, _, _ = _get_fragment_loader(environment).get_fragments(
+        environment, template
+    )
+    references = re.compile(
+        rf"{re.escape(environment.block_start_string)}[-+]?\s*"
+        r"(?:include|import|from|extends)\b"
+    )
+
+    jobs = []
+    for fragment in fragments:
+        if references.search(sources.get(fragment, "")):
+            job_context = context
+
+        else:
+            job_context = {
+                key: value
+                for key, value in context.items()
+                if key in dependencies.get(fragment, ())
+            }
+
+        jobs.append((f"{template}#{fragment}", job_context))
+
+    if len(jobs) < min_jobs:
+        outputs = [
+            environment.get_template(name).render(job_context)
+            for name, job_context in jobs
+        ]
+
+    else:
+        if executor is None:
+            executor = _factory_executor(environment_factory)
+
+        outputs = list(executor.map(_render_in_worker, *zip(*jobs)))
+
+    return "\n".join(outputs)
+
+
+_worker_environment: Optional[jinja2.Environment] = None
+_factory_executors: Dict[Callable[[], jinja2.Environment], ProcessPoolExecutor] = {}
+_factory_lock = threading.Lock()
+
+
+def fragment_process_pool(
+    environment_factory: Callable[[], jinja2.Environment],
+    max_workers: Optional[int] = None,
+) -> ProcessPoolExecutor:
+    """Create a process pool whose workers render with the factory's environment
+
+    See `render_fragments_parallel`.
+    """
+    return ProcessPoolExecutor(
+        max_workers,
+        initializer=_init_worker,
+        initargs=(environment_factory,),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _factory_environment(environment_factory):
+    return environment_factory()
+
+
+def _factory_executor(environment_factory) -> ProcessPoolExecutor:
+    with _factory_lock:
+        executor = _factory_executors.get(environment_factory)
+        if executor is None:
+            executor = _factory_executors[environment_factory] = fragment_process_pool(
+                environment_factory
+            )
+
+        return executor
+
+
+def _init_worker(environment_factory):
+    global _worker_environment
+    _worker_environment = environment_factory()
+
+
+def _render_in_worker(name: str, context: Dict[str, Any]) -> str:
+    if _worker_environment is None:
+        raise RuntimeError("The worker was not initialized with an environment")
+
+    return _worker_environment.get_template(name).render(context)
+
+
+class UsageProfile:
+    """Counts of how often templates and fragments are requested
+
+    Usage:
+
+    ```python
+    profile = UsageProfile.load("fragments-profile.json")
+    profile.install(env)
+
+    # periodically or at shutdown
+    profile.save("fragments-profile.json")
+    ```
+    """
+
+    def __init__(self, counts: Optional[Dict[str, int]] = None):
+        self.counts: Dict[str, int] = dict(counts or {})
+        self._lock = threading.Lock()
+
+    def install(self, environment: jinja2.Environment) -> jinja2.Environment:
+        """Count each template lookup of the environment
+
+        The template cache of the environment is wrapped, such that lookups
+        served from the cache are counted as well. This works with any loader,
+        e.g., the dispatching loader of Flask. Installing the same profile
+        again has no effect. Returns the environment.
+        """
+        cache = environment.cache
+        if not (isinstance(cache, _ProfiledCache) and cache.profile is self):
+            environment.cache = _ProfiledCache(cache, self)
+
+        return environment
+
+    def record(self, name: str):
+        """Count a request of the template or fragment"""
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def hottest(self, n: Optional[int] = None) -> List[str]:
+        """Return the `n` most frequently requested names, the most frequent first"""
+        with self._lock:
+            names = sorted(self.counts, key=lambda name: (-self.counts[name], name))
+
+        return names if n is None else names[:n]
+
+    def save(self, path):
+        """Write the counts as JSON, replacing the file atomically"""
+        with self._lock:
+            data = json.dumps(self.counts, sort_keys=True, separators=(",", ":"))
+
+        path = pathlib.Path(path)
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        tmp_path.write_text(data)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path) -> "UsageProfile":
+        """Read a saved profile, a missing file results in an empty profile"""
+        path = pathlib.Path(path)
+        if not path.exists():
+            return cls()
+
+        return cls(json.loads(path.read_text()))
+
+
+def warmup(
+    environment: jinja2.Environment,
+    profile,
+    *,
+    top: Optional[int] = None,
+    budget: Optional[float] = None,
+) -> List[str]:
+    """Load the most frequently used templates and fragments of a profile
+
+    `profile` is a `UsageProfile` or the path of a saved profile. Names are
+    loaded from the most to the least frequent, at most `top` of them and,
+    if `budget` is given, only until it is exceeded in seconds. Names that no
+    longer exist are skipped. Returns the names of all loaded templates.
+
+    Record the profile with `UsageProfile.install`. In Flask, install it on
+    `app.jinja_env`.
+
+    Usage:
+
+    ```python
+    warmup(env, "fragments-profile.json", top=500, budget=2.0)
+    UsageProfile.load("fragments-profile.json").install(env)
+    ```
+    """
+    if not isinstance(profile, UsageProfile):
+        profile = UsageProfile.load(profile)
+
+    deadline = None if budget is None else time.monotonic() + budget
+
+    loaded = []
+    for name in profile.hottest(top):
+        try:
+            environment.get_template(name)
+
+        except jinja2.TemplateNotFound:
+            continue
+
+        loaded.append(name)
+        if deadline is not None and time.monotonic() > deadline:
+            break
+
+    return loaded
+
+
+def _get_fragment_loader(environment: jinja2.Environment) -> FragmentLoader:
+    if not isinstance(environment.loader, FragmentLoader):
+        raise TypeError("The environment does not use a FragmentLoader")
+
+    return environment.loader
+
+
+class RenderCache:
+    """A cache for rendered templates bounded by total size and age
+
+    Parameters:
+
+    - `max_size`: the maximum number of cached bytes, outputs are counted
+      with their UTF-8 encoded size
+    - `ttl`: the default time to live of entries in seconds. If `None`, entries
+      only expire when they are evicted or the template is reloaded
+
+    Entries are invalidated once the template they were rendered with is no
+    longer up to date or the environment loaded the template again, e.g.,
+    because its source changed and `auto_reload` is enabled. With
+    `cache_size=0` the environment loads a new template for each call, then
+    entries are only invalidated via the `uptodate` function of the loader.
+    Templates without `uptodate` function are considered up to date.
+
+    Cache keys distinguish context values of different types, e.g., `1`,
+    `1.0` and `True`.
+    """
+
+    def __init__(self, max_size: int = 16 * 1024 * 1024, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.size = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(
+        self,
+        environment: jinja2.Environment,
+        name: str,
+        context: Optional[Dict[str, Any]] = None,
+        *,
+        key: Optional[Hashable] = None,
+        ttl: Optional[float] = None,
+    ) -> str:
+        """Render the template or return the cached output
+
+        If `key` is not given, it is derived from the context, which then has
+        to contain only hashable values.
+        """
+        context = {} if context is None else context
+        template = environment.get_template(name)
+        cache_key = (name, _context_key(context) if key is None else key)
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                entry_template, expires, output, _ = entry
+                if (entry_template is template or entry_template.is_up_to_date) and (
+                    expires is None or expires > time.monotonic()
+                ):
+                    self._entries.move_to_end(cache_key)
+                    return output
+
+                self._remove(cache_key)
+
+        output = template.render(context)
+        ttl = self.ttl if ttl is None else ttl
+        expires = None if ttl is None else time.monotonic() + ttl
+
+        with self._lock:
+            if cache_key in self._entries:
+                self._remove(cache_key)
+
+            size = len(output.encode("utf-8"))
+            if size <= self.max_size:
+                self._entries[cache_key] = (template, expires, output, size)
+                self.size += size
+
+            while self.size > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+        return output
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, cache_key):
+        _, _, _, size = self._entries.pop(cache_key)
+        self.size -= size
+
+
+class FragmentCache(collections.abc.MutableMapping):
+    """A cache for compiled templates that keeps fragments of a page together
+
+    Usage:
+
+    ```python
+    env = jinja2.Environment(loader=FragmentLoader(base_loader))
+    env.cache = FragmentCache()
+    ```
+
+    A template and its fragments form a group that is evicted as a whole, the
+    least recently used group first. A new group only displaces another one if
+    it was requested at least as often recently, so one-off renders do not
+    evict frequently used fragments. Request frequencies are halved
+    periodically to adapt to changing traffic.
+
+    The size of the cache is bounded by `max_size`, an estimate of the memory
+    used by the compiled code in bytes. The counters `hits`, `misses`,
+    `evictions` and `rejections` track the effectiveness of the cache.
+    """
+
+    # used by jinja2 when creating the cache of an overlay environment
+    capacity = 400
+
+    def __init__(self, max_size: int = 64 * 1024 * 1024):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejections = 0
+        self._groups: OrderedDict = OrderedDict()
+        self._frequencies: Dict[Hashable, int] = {}
+        self._samples = 0
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        group = _cache_group(key)
+        with self._lock:
+            self._count(group)
+
+            entries = self._groups.get(group)
+            if entries is None or key not in entries:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            self._groups.move_to_end(group)
+            return entries[key][0]
+
+    def __getitem__(self, key):
+        with self._lock:
+            entries = self._groups.get(_cache_group(key))
+            if entries is None or key not in entries:
+                raise KeyError(key)
+
+            return entries[key][0]
+
+    def __setitem__(self, key, template):
+        group = _cache_group(key)
+        size = _template_size(template)
+
+        with self._lock:
+            if key in self:
+                del self[key]
+
+            self._groups.setdefault(group, {})[key] = template, size
+            self._groups.move_to_end(group)
+            self.size += size
+
+            while self.size > self.max_size and len(self._groups) > 1:
+                victim = next(iter(self._groups))
+                if self._frequencies.get(group, 0) < self._frequencies.get(victim, 0):
+                    del self[key]
+                    self.rejections += 1
+                    break
+
+                for _, victim_size in self._groups.pop(victim).values():
+                    self.size -= victim_size
+                    self.evictions += 1
+
+    def __delitem__(self, key):
+        group = _cache_group(key)
+        with self._lock:
+            entries = self._groups.get(group)
+            if entries is None or key not in entries:
+                raise KeyError(key)
+
+            _, size = entries.pop(key)
+            self.size -= size
+            if not entries:
+                del self._groups[group]
+
+    def __contains__(self, key) -> bool:
+        entries = self._groups.get(_cache_group(key))
+        return entries is not None and key in entries
+
+    def __iter__(self):
+        with self._lock:
+            keys = [key for entries in self._groups.values() for key in entries]
+
+        return iter(keys)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._groups.values())
+
+    def clear(self):
+        """Remove all templates"""
+        with self._lock:
+            self._groups.clear()
+            self.size = 0
+
+    def copy(self) -> "FragmentCache":
+        """Return a copy with the same templates and statistics"""
+        with self._lock:
+            res = FragmentCache(self.max_size)
+            res._groups = OrderedDict(
+                (group, dict(entries)) for group, entries in self._groups.items()
+            )
+            res._frequencies = dict(self._frequencies)
+            res.size = self.size
+            return res
+
+    def _count(self, group):
+        self._frequencies[group] = self._frequencies.get(group, 0) + 1
+        self._samples += 1
+
+        if self._samples >= 10 * max(len(self._frequencies), 64):
+            self._samples //= 2
+            self._frequencies = {
+                group: frequency // 2
+                for group, frequency in self._frequencies.items()
+                if frequency > 1
+            }
+
+
+def _cache_group(key) -> Hashable:
+    # jinja2 uses (weakref to the loader, template name) as cache keys
+    if isinstance(key, tuple) and len(key) == 2 and isinstance(key[1], str):
+        return key[0], split_path(key[1])[0]
+
+    return key
+
+
+def _template_size(template) -> int:
+    functions = [template.root_render_func, *template.blocks.values()]
+    return 1024 + sum(
+        len(function.__code__.co_code) + 16 * len(function.__code__.co_consts)
+        for function in functions
+    )
+
+
+def render_fragment_cached(
+    environment: jinja2.Environment,
+    name: str,
+    context: Optional[Dict[str, Any]] = None,
+    *,
+    key: Optional[Hashable] = None,
+    ttl: Optional[float] = None,
+    cache: Optional[RenderCache] = None,
+) -> str:
+    """Render a template or fragment, reusing previous outputs
+
+    Usage:
+
+    ```python
+    nav = render_fragment_cached(env, "page.html#nav", {"user": user.id}, ttl=60)
+    ```
+
+    Without an explicit `cache`, a `RenderCache` attached to the environment as
+    `environment.fragment_render_cache` is used.
+    """
+    if cache is None:
+        cache = getattr(environment, "fragment_render_cache", None)
+
+    if cache is None:
+        with _render_cache_lock:
+            cache = getattr(environment, "fragment_render_cache", None)
+            if cache is None:
+                environment.extend(fragment_render_cache=RenderCache())
+                cache = environment.fragment_render_cache
+
+    return cache.render(environment, name, context, key=key, ttl=ttl)
+
+
+_render_cache_lock = threading.Lock()
+
+
+def _context_key(context: Dict[str, Any]) -> Hashable:
+    key = tuple(sorted((key, type(value), value) for key, value in context.items()))
+    try:
+        hash(key)
+
+    except TypeError:
+        raise TypeError(
+            "Cannot derive a cache key from a context with unhashable values, "
+            "pass an explicit key"
+        ) from None
+
+    return key
+
+
+def render_changed_fragments(
+    environment: jinja2.Environment,
+    template: str,
+    context: Optional[Dict[str, Any]] = None,
+    client_hashes: Optional[Mapping[str, str]] = None,
+    *,
+    fragments: Optional[Iterable[str]] = None,
+    targets: Optional[Mapping[str, str]] = None,
+    cache: Optional[RenderCache] = None,
+    key: Optional[Hashable] = None,
+) -> Tuple[str, Dict[str, str]]:
+    """Render the fragments of a template whose output differs from the client
+
+    Each fragment, by default all top-level fragments of the template, is
+    rendered with the same context and its output is hashed. Fragments whose
+    hash differs from `client_hashes` are returned as htmx out-of-band swaps
+    that replace the content of the element with the id given by `targets` or
+    the fragment name. Returns the response body and the hashes of all fragments.
+
+    With a `RenderCache` as `cache`, outputs are reused as for
+    `render_fragment_cached`.
+
+    Usage:
+
+    ```python
+    body, hashes = render_changed_fragments(
+        env,
+        "dashboard.html",
+        context,
+        parse_fragment_hashes(request.headers.get("X-Fragment-Hashes", "")),
+    )
+    headers = {"X-Fragment-Hashes": format_fragment_hashes(hashes)}
+    ```
+    """
+    context = {} if context is None else context
+    client_hashes = {} if client_hashes is None else client_hashes
+    targets = {} if targets is None else targets
+
+    if fragments is None:
+        fragments = _top_level_fragments(
+            _get_fragment_loader(environment), environment, template
+        )
+
+    parts = []
+    hashes = {}
+    for fragment in fragments:
+        name = f"{template}#{fragment}"
+        if cache is not None:
+            output = cache.render(environment, name, context, key=key)
+
+        else:
+            output = environment.get_template(name).render(context)
+
+        digest = hashes[fragment] = _hasher(output.encode("utf-8")).hexdigest()
+        if client_hashes.get(fragment) == digest:
+            continue
+
+        target = markupsafe.escape(targets.get(fragment, fragment))
+        parts.append(f'<div id="{target}" hx-swap-oob="innerHTML">{output}</div>')
+
+    return "\n".join(parts), hashes
+
+
+def _top_level_fragments(
+    loader: FragmentLoader, environment: jinja2.Environment, template: str
+) -> List[str]:
+    parents = loader.get_fragment_parents(environment, template)
+    return [fragment for fragment, enclosing in parents.items() if not enclosing]
+
+
+def parse_fragment_hashes(header: str) -> Dict[str, str]:
+    """Parse a header of comma separated `fragment=hash` pairs"""
+    hashes = {}
+    for item in header.split(","):
+        fragment, sep, digest = item.strip().partition("=")
+        if sep:
+            hashes[fragment] = digest
+
+    return hashes
+
+
+def format_fragment_hashes(hashes: Mapping[str, str]) -> str:
+    """Format fragment hashes as a header, see `parse_fragment_hashes`"""
+    return ",".join(f"{fragment}={digest}" for fragment, digest in hashes.items())
+
+
+class LatencyHistogram:
+    """A log-linear histogram of durations with a bounded relative error
+
+    Durations are recorded in microseconds. Each power of two is divided into
+    16 buckets, so quantiles are accurate to about 6 %, independent of the
+    magnitude of the values. Only non-empty buckets are stored.
+    """
+
+    _sub_bits = 4
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+        self.buckets: Dict[int, int] = {}
+
+    def record(self, value: int):
+        """Record a duration in microseconds"""
+        index = self._index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[int]:
+        """Return the highest value equivalent to the `q` quantile"""
+        if not self.count:
+            return None
+
+        rank = max(1, round(q * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self._highest_value(index), self.max)
+
+        return self.max
+
+    @classmethod
+    def _index(cls, value: int) -> int:
+        if value < 1 << cls._sub_bits:
+            return max(value, 0)
+
+        shift = value.bit_length() - cls._sub_bits - 1
+        return ((shift + 1) << cls._sub_bits) + (value >> shift) - (1 << cls._sub_bits)
+
+    @classmethod
+    def _highest_value(cls, index: int) -> int:
+        if index < 1 << cls._sub_bits:
+            return index
+
+        shift = (index >> cls._sub_bits) - 1
+        lowest = ((index & ((1 << cls._sub_bits) - 1)) + (1 << cls._sub_bits)) << shift
+        return lowest + (1 << shift) - 1
+
+
+class RenderStats:
+    """Render latencies per template and fragment, see `instrument`"""
+
+    def __init__(
+        self,
+        threshold: Optional[float] = 0.1,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.threshold = threshold
+        self.logger = logger if logger is not None else _logger
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, duration: float, size: int):
+        """Record a render of `name` that took `duration` seconds"""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+
+            histogram.record(int(duration * 1e6))
+
+        if self.threshold is not None and duration > self.threshold:
+            self.logger.warning(
+                "Slow render of %s: %.1f ms, %d characters",
+                name,
+                1e3 * duration,
+                size,
+            )
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return count, mean, min, max and quantiles in milliseconds per name"""
+        with self._lock:
+            return {
+                name: {
+                    "count": histogram.count,
+                    "mean": 1e-3 * histogram.total / histogram.count,
+                    "min": 1e-3 * histogram.min,
+                    "p50": 1e-3 * histogram.quantile(0.5),
+                    "p90": 1e-3 * histogram.quantile(0.9),
+                    "p99": 1e-3 * histogram.quantile(0.99),
+                    "max": 1e-3 * histogram.max,
+                }
+                for name, histogram in self.histograms.items()
+                if histogram.count
+            }
+
+    def clear(self):
+        """Remove all recorded renders"""
+        with self._lock:
+            self.histograms.clear()
+
+
+def instrument(
+    environment: jinja2.Environment,
+    *,
+    threshold: Optional[float] = 0.1,
+    logger: Optional[logging.Logger] = None,
+) -> RenderStats:
+    """Record the render latency of each template and fragment
+
+    Usage:
+
+    ```python
+    stats = instrument(env, threshold=0.05)
+    ...
+    stats.snapshot()["page.html#row"]["p99"]
+    ```
+
+    Calls of `render`, `render_async`, `generate` and `generate_async` are
+    timed per template name, e.g., `page.html#row`. The time of `generate`
+    includes the time the consumer spends between chunks. Renders slower
+    than `threshold` seconds are logged as warnings together with the size of
+    their output. The template cache of the environment is cleared.
+    """
+    stats = RenderStats(threshold, logger)
+    base_class = environment.template_class
+
+    class InstrumentedTemplate(base_class):  # type: ignore
+        def render(self, *args, **kwargs):
+            if self.environment.is_async:
+                return super().render(*args, **kwargs)
+
+            start = time.perf_counter()
+            output = super().render(*args, **kwargs)
+            stats.record(self.name, time.perf_counter() - start, len(output))
+            return output
+
+        async def render_async(self, *args, **kwargs):
+            start = time.perf_counter()
+            output = await super().render_async(*args, **kwargs)
+            stats.record(self.name, time.perf_counter() - start, len(output))
+            return output
+
+        def generate(self, *args, **kwargs):
+            if self.environment.is_async:
+                yield from super().generate(*args, **kwargs)
+                return
+
+            start = time.perf_counter()
+            size = 0
+            for chunk in super().generate(*args, **kwargs):
+                size += len(chunk)
+                yield chunk
+
+            stats.record(self.name, time.perf_counter() - start, size)
+
+        async def generate_async(self, *args, **kwargs):
+            start = time.perf_counter()
+            size = 0
+            async for chunk in super().generate_async(*args, **kwargs):
+                size += len(chunk)
+                yield chunk
+
+            stats.record(self.name, time.perf_counter() - start, size)
+
+    environment.template_class = InstrumentedTemplate
+    if environment.cache is not None:
+        environment.cache.clear()
+
+    return stats
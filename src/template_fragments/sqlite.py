@@ -0,0 +1,139 @@
+"""A store of pre-split fragments backed by SQLite
+
+Usage:
+
+```python
+from template_fragments.jinja import FragmentStoreLoader
+from template_fragments.sqlite import FragmentStore
+
+store = FragmentStore("fragments.sqlite")
+store.publish({"page.html": source})
+
+env = jinja2.Environment(loader=FragmentStoreLoader(store))
+env.get_template("page.html#item")
+```
+"""
+
+import hashlib
+import sqlite3
+import threading
+
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from ._base import split_templates
+
+_schema = """
+CREATE TABLE IF NOT EXISTS templates (
+    template TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fragments (
+    template TEXT NOT NULL,
+    fragment TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (template, fragment, version)
+) WITHOUT ROWID;
+"""
+
+
+class FragmentStore:
+    """Persist the fragments of templates in a SQLite database
+
+    Each fragment is stored as one row per template, fragment and version.
+    Publishing a changed template increments its version. Every thread uses
+    its own connection, therefore `path` should refer to a file.
+    """
+
+    def __init__(self, path, *, minify: bool = False):
+        self.path = str(path)
+        self.minify = minify
+        self._local = threading.local()
+
+        with self._connection() as conn:
+            conn.executescript(_schema)
+
+    def publish(self, templates: Mapping[str, str]) -> Dict[str, int]:
+        """Split and store the given templates in a single transaction
+
+        `templates` maps template names to their sources. Unchanged templates
+        keep their version, fragments of previous versions are removed.
+        Returns the current version of each template.
+        """
+        versions = {}
+        with self._connection() as conn:
+            for template, source in templates.items():
+                digest = hashlib.blake2b(source.encode("utf-8")).hexdigest()
+                row = conn.execute(
+                    "SELECT version, digest FROM templates WHERE template = ?",
+                    (template,),
+                ).fetchone()
+                if row is not None and row[1] == digest:
+                    versions[template] = row[0]
+                    continue
+
+                version = versions[template] = 1 if row is None else row[0] + 1
+                conn.executemany(
+                    "INSERT OR REPLACE INTO fragments VALUES (?, ?, ?, ?)",
+                    [
+                        (template, fragment, version, fragment_source)
+                        for fragment, fragment_source in split_templates(
+                            source, minify=self.minify
+                        ).items()
+                    ],
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO templates VALUES (?, ?, ?)",
+                    (template, version, digest),
+                )
+                conn.execute(
+                    "DELETE FROM fragments WHERE template = ? AND version < ?",
+                    (template, version),
+                )
+
+        return versions
+
+    def get(self, template: str, fragment: str = "") -> Optional[Tuple[str, int]]:
+        """Return the source and version of the current version of a fragment
+
+        Returns `None` if the template is unknown. Unknown fragments of known
+        templates are returned as an empty source.
+        """
+        row = (
+            self._connection()
+            .execute(
+                "SELECT coalesce(f.source, ''), t.version FROM templates t "
+                "LEFT JOIN fragments f ON f.template = t.template "
+                "AND f.fragment = ? AND f.version = t.version "
+                "WHERE t.template = ?",
+                (fragment, template),
+            )
+            .fetchone()
+        )
+        return None if row is None else (row[0], row[1])
+
+    def version(self, template: str) -> Optional[int]:
+        """Return the current version of a template or `None` if it is unknown"""
+        row = (
+            self._connection()
+            .execute("SELECT version FROM templates WHERE template = ?", (template,))
+            .fetchone()
+        )
+        return None if row is None else row[0]
+
+    def list_templates(self) -> List[str]:
+        """Return the names of all stored templates"""
+        return [
+            template
+            for (template,) in self._connection().execute(
+                "SELECT template FROM templates ORDER BY template"
+            )
+        ]
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            conn = self._local.connection = sqlite3.connect(self.path)
+
+        return conn
@@ -0,0 +1,300 @@
+"""Starlette specific helpers
+
+Usage:
+
+```python
+templates = Jinja2Templates(
+    env=jinja2.Environment(loader=FileSystemLoader("templates"), enable_async=True)
+)
+install_fragment_loader(templates)
+
+
+async def get_item(request):
+    return FragmentResponse(templates, request, "index.html#item", {"item": ...})
+```
+"""
+
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Mapping,
+    Optional,
+    Sequence,
+    Union,
+)
+
+from ._base import split_path
+from .jinja import (
+    FragmentLoader,
+    _combine_etag,
+    format_fragment_hashes,
+    parse_fragment_hashes,
+    render_changed_fragments,
+    stream_fragments,
+)
+
+import jinja2
+
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.templating import Jinja2Templates
+
+
+def install_fragment_loader(templates: Jinja2Templates) -> FragmentLoader:
+    """Wrap the loader of the templates environment in a `FragmentLoader`"""
+    loader = templates.env.loader
+    if not isinstance(loader, FragmentLoader):
+        loader = templates.env.loader = FragmentLoader(loader)
+
+    return loader
+
+
+async def get_template_async(templates: Jinja2Templates, name: str) -> jinja2.Template:
+    """Get a template, loading and splitting its source in the thread pool
+
+    Once the fragments of the template are split, the template is retrieved
+    directly on the event loop.
+    """
+    loader = templates.env.loader
+    template, _ = split_path(name)
+    if isinstance(loader, FragmentLoader) and loader.has_fragments(template):
+        return templates.get_template(name)
+
+    return await run_in_threadpool(templates.get_template, name)
+
+
+class FragmentResponse(StreamingResponse):
+    """Render a template or fragment with `generate_async` and stream the chunks
+
+    The templates environment must be created with `enable_async=True`. As
+    for `Jinja2Templates.TemplateResponse`, the request and the results of the
+    context processors are added to the context.
+    """
+
+    def __init__(
+        self,
+        templates: Jinja2Templates,
+        request: Request,
+        name: str,
+        context: Optional[Dict[str, Any]] = None,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: str = "text/html",
+        background: Optional[BackgroundTask] = None,
+    ):
+        context = {**(context or {}), "request": request}
+        for context_processor in templates.context_processors:
+            context.update(context_processor(request))
+
+        super().__init__(
+            _generate(templates, name, context),
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+            background=background,
+        )
+        self.template_name = name
+        self.context = context
+
+
+class ProgressiveResponse(StreamingResponse):
+    """Stream a page and fill in its fragments once their data is ready
+
+    Context values can be awaitables. The page is sent with placeholders for
+    the fragments that reference them, each fragment follows as soon as its
+    values are available, see `template_fragments.jinja.stream_fragments`. As
+    for `Jinja2Templates.TemplateResponse`, the request and the results of the
+    context processors are added to the context.
+    """
+
+    def __init__(
+        self,
+        templates: Jinja2Templates,
+        request: Request,
+        name: str,
+        context: Optional[Dict[str, Any]] = None,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: str = "text/html",
+        background: Optional[BackgroundTask] = None,
+        *,
+        fragments: Optional[Sequence[str]] = None,
+    ):
+        install_fragment_loader(templates)
+        context = {**(context or {}), "request": request}
+        for context_processor in templates.context_processors:
+            context.update(context_processor(request))
+
+        super().__init__(
+            stream_fragments(templates.env, name, context, fragments=fragments),
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+            background=background,
+        )
+        self.template_name = name
+        self.context = context
+
+
+async def _generate(
+    templates: Jinja2Templates, name: str, context: Dict[str, Any]
+) -> AsyncIterator[str]:
+    template = await get_template_async(templates, name)
+    async for chunk in template.generate_async(context):
+        yield chunk
+
+
+async def render_static_fragment(
+    templates: Jinja2Templates, request: Request, name: str
+) -> Response:
+    """Serve a fragment without template syntax without rendering it
+
+    The precomputed body is sent in the best content encoding accepted by the
+    client together with an ETag. Fragments that are not static are rendered
+    with a `FragmentResponse` without any context.
+    """
+    loader = install_fragment_loader(templates)
+    template, _ = split_path(name)
+    if loader.has_fragments(template):
+        static = loader.get_static(templates.env, name)
+
+    else:
+        static = await run_in_threadpool(loader.get_static, templates.env, name)
+
+    if static is None:
+        return FragmentResponse(templates, request, name)
+
+    headers = {"Vary": "Accept-Encoding", "ETag": f'"{static.digest}"'}
+    encoding = _best_encoding(
+        request.headers.get("Accept-Encoding", ""), static.encoded
+    )
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+
+    return Response(
+        static.encoded[encoding] if encoding is not None else static.body,
+        headers=headers,
+        media_type="text/html",
+    )
+
+
+async def render_conditional(
+    templates: Jinja2Templates,
+    request: Request,
+    name: str,
+    version: Any = "",
+    context: Union[
+        Dict[str, Any], Callable[[], Awaitable[Dict[str, Any]]], None
+    ] = None,
+) -> Response:
+    """Render a template or fragment unless the client has an up to date copy
+
+    The ETag combines the digest of the fragment source and of the templates
+    it extends, includes or imports with the `version` of the data, see
+    `template_fragments.jinja.fragment_etag`. Templates referenced by dynamic
+    names are not part of the digest, they have to be covered by `version`.
+    If the ETag matches the `If-None-Match` header, an empty `304 Not
+    Modified` response is returned without compiling or rendering the
+    template. `context` can be given as a coroutine function that is only
+    awaited, if the template is rendered.
+    """
+    loader = install_fragment_loader(templates)
+    template, _ = split_path(name)
+    if loader.has_fragments(template):
+        digest = loader.digest(templates.env, name)
+
+    else:
+        digest = await run_in_threadpool(loader.digest, templates.env, name)
+
+    etag = _combine_etag(digest, version)
+    headers = {"ETag": f'"{etag}"'}
+    if _etag_matches(request.headers.get("If-None-Match", ""), etag):
+        return Response(status_code=304, headers=headers)
+
+    if callable(context):
+        context = await context()
+
+    return FragmentResponse(templates, request, name, context, headers=headers)
+
+
+async def render_fragment_diff(
+    templates: Jinja2Templates,
+    request: Request,
+    name: str,
+    context: Optional[Dict[str, Any]] = None,
+    *,
+    fragments: Optional[Iterable[str]] = None,
+    targets: Optional[Mapping[str, str]] = None,
+) -> Response:
+    """Render only the fragments whose output changed since the last request
+
+    The client sends the hashes of its fragments in the `X-Fragment-Hashes`
+    header and receives the changed fragments as htmx out-of-band swaps
+    together with the new hashes in the same header. The fragments are
+    rendered in the thread pool, see
+    `template_fragments.jinja.render_changed_fragments`.
+    """
+    install_fragment_loader(templates)
+    context = {**(context or {}), "request": request}
+    for context_processor in templates.context_processors:
+        context.update(context_processor(request))
+
+    body, hashes = await run_in_threadpool(
+        render_changed_fragments,
+        templates.env,
+        name,
+        context,
+        parse_fragment_hashes(request.headers.get("X-Fragment-Hashes", "")),
+        fragments=fragments,
+        targets=targets,
+    )
+    return Response(
+        body,
+        headers={
+            "X-Fragment-Hashes": format_fragment_hashes(hashes),
+            "Vary": "X-Fragment-Hashes",
+        },
+        media_type="text/html",
+    )
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    for item in if_none_match.split(","):
+        item = item.strip()
+        if item.startswith("W/"):
+            item = item[2:]
+
+        if item == "*" or item.strip('"') == etag:
+            return True
+
+    return False
+
+
+def _best_encoding(accept_encoding: str, encodings: Iterable[str]) -> Optional[str]:
+    qualities = {}
+    for item in accept_encoding.split(","):
+        encoding, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+
+                except ValueError:
+                    quality = 0.0
+
+        qualities[encoding.strip().lower()] = quality
+
+    candidates = [
+        (qualities.get(encoding, qualities.get("*", 0.0)), encoding)
+        for encoding in encodings
+    ]
+    quality, encoding = max(candidates, default=(0.0, None))
+    return encoding if quality > 0 else None
@@ -0,0 +1,102 @@
+import pathlib
+
+import django
+import pytest
+
+from django.conf import settings
+from django.template import Context, Engine
+
+from template_fragments.django import warmup
+
+self_path = pathlib.Path(__file__).parent.resolve()
+
+if not settings.configured:
+    settings.configure()
+    django.setup()
+
+listing = ["hello", "world"]
+content = ["foo", "bar", "baz"]
+
+expected_index = """\
+<body>
+<ul>
+    <li>hello</li>
+    <li>world</li>
+</ul>
+<div>
+    <div>foo</div>
+    <div>bar</div>
+    <div>baz</div>
+</div>
+</body>
+"""
+
+expected_listing = """\
+    <li>hello</li>
+    <li>world</li>
+"""
+
+expected_content = """\
+<div>
+    <div>foo</div>
+    <div>bar</div>
+    <div>baz</div>
+</div>
+"""
+
+expected_item = """\
+    <div>foo</div>
+"""
+
+examples = [
+    ("index.html", expected_index),
+    ("index.html#listing", expected_listing),
+    ("index.html#content", expected_content),
+    ("index.html#content-item", expected_item),
+]
+
+
+def make_engine(cached: bool) -> Engine:
+    loaders = [
+        (
+            "template_fragments.django.Loader",
+            ["django.template.loaders.filesystem.Loader"],
+        )
+    ]
+    if cached:
+        loaders = [("django.template.loaders.cached.Loader", loaders)]
+
+    return Engine(dirs=[self_path / "templates"], loaders=loaders)
+
+
+@pytest.mark.parametrize("cached", [False, True])
+@pytest.mark.parametrize("name, expected", examples)
+def test_render(cached, name, expected):
+    engine = make_engine(cached)
+    context = Context({"listing": listing, "content": content, "item": "foo"})
+
+    actual = engine.get_template(name).render(context)
+    actual = "\n".join(line for line in actual.splitlines() if line.strip()) + "\n"
+
+    assert actual == expected
+
+
+def test_index_reused_per_origin():
+    engine = make_engine(cached=True)
+    (cached_loader,) = engine.template_loaders
+    (loader,) = cached_loader.loaders
+
+    for name, _ in examples:
+        engine.get_template(name)
+
+    assert len(loader._index) == 1
+
+
+def test_warmup():
+    engine = make_engine(cached=True)
+    (cached_loader,) = engine.template_loaders
+
+    loaded = warmup(engine, ["index.html"])
+
+    assert sorted(loaded) == sorted(name for name, _ in examples)
+    assert set(cached_loader.get_template_cache) == set(loaded)
@@ -0,0 +1,40 @@
+from flask import Flask
+
+from template_fragments.flask import render_conditional
+from template_fragments.jinja import FragmentLoader
+
+app = Flask(__name__)
+app.jinja_loader = FragmentLoader(app.jinja_loader)
+
+renders = []
+
+
+def item_context():
+    renders.append(1)
+    return {"item": "foo"}
+
+
+@app.route("/item/<int:version>")
+def get_item(version):
+    return render_conditional("index.html#content-item", version, item_context)
+
+
+def test_not_modified():
+    del renders[:]
+    client = app.test_client()
+
+    response = client.get("/item/1")
+    etag, _ = response.get_etag()
+    assert response.status_code == 200
+    assert response.text == "    <div>foo</div>"
+
+    response = client.get("/item/1", headers={"If-None-Match": f'"{etag}"'})
+    assert response.status_code == 304
+    assert response.get_etag()[0] == etag
+    assert response.data == b""
+
+    response = client.get("/item/2", headers={"If-None-Match": f'"{etag}"'})
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+
+    assert len(renders) == 2
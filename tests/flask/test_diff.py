@@ -0,0 +1,52 @@
+from flask import Flask
+
+from template_fragments.flask import render_fragment_diff
+from template_fragments.jinja import FragmentLoader
+
+app = Flask(__name__)
+app.jinja_loader = FragmentLoader(app.jinja_loader)
+
+content = ["foo", "bar", "baz"]
+
+
+@app.context_processor
+def inject_listing():
+    return {"listing": ["injected"]}
+
+
+@app.route("/poll")
+def poll():
+    return render_fragment_diff(
+        "index.html", ["listing", "content"], listing=["hello"], content=content
+    )
+
+
+@app.route("/poll-all")
+def poll_all():
+    return render_fragment_diff("index.html", content=content)
+
+
+def test_fragment_diff():
+    client = app.test_client()
+
+    response = client.get("/poll")
+    hashes = response.headers["X-Fragment-Hashes"]
+    assert 'id="listing"' in response.text
+    assert 'id="content"' in response.text
+    assert "X-Fragment-Hashes" in response.vary
+
+    content.append("qux")
+    response = client.get("/poll", headers={"X-Fragment-Hashes": hashes})
+    assert 'id="listing"' not in response.text
+    assert 'id="content"' in response.text
+    assert "<div>qux</div>" in response.text
+
+
+def test_defaults_to_top_level_fragments_and_context_processors():
+    client = app.test_client()
+
+    response = client.get("/poll-all")
+    assert response.headers["X-Fragment-Hashes"].count("=") == 2
+    assert 'id="listing"' in response.text
+    assert "<li>injected</li>" in response.text
+    assert 'id="content-item"' not in response.text
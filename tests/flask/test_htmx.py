@@ -0,0 +1,72 @@
+import pytest
+
+from flask import Flask
+
+from template_fragments.flask import Fragments
+from template_fragments.jinja import FragmentLoader
+
+app = Flask(__name__)
+fragments = Fragments(app)
+
+listing = ["hello", "world"]
+content = ["foo", "bar", "baz"]
+
+
+@app.route("/")
+def get_index():
+    return fragments.render_template(
+        "index.html", targets={"items": "listing"}, listing=listing, content=content
+    )
+
+
+expected_listing = """
+    <li>hello</li>
+    <li>world</li>\
+"""
+
+expected_content = """\
+<div>
+    <div>foo</div>
+    <div>bar</div>
+    <div>baz</div>
+</div>\
+"""
+
+htmx = {"HX-Request": "true"}
+
+examples = [
+    ({**htmx, "HX-Target": "items"}, expected_listing),
+    ({**htmx, "HX-Target": "content"}, expected_content),
+    ({**htmx, "HX-Target": "#content"}, expected_content),
+    ({**htmx, "HX-Target": "unknown"}, None),
+    ({**htmx, "HX-Target": "content", "HX-Boosted": "true"}, None),
+    (htmx, None),
+    ({"HX-Target": "content"}, None),
+    ({}, None),
+]
+
+
+@pytest.mark.parametrize("headers, expected", examples)
+def test_targeted_fragment(headers, expected):
+    response = app.test_client().get("/", headers=headers)
+
+    assert response.status_code == 200
+    assert "HX-Request" in response.vary
+    assert "HX-Target" in response.vary
+
+    if expected is None:
+        assert response.text.startswith("<body>")
+        assert "<li>hello</li>" in response.text
+        assert "<div>baz</div>" in response.text
+
+    else:
+        assert response.text == expected
+
+
+def test_existing_fragment_loader_is_kept():
+    other = Flask(__name__)
+    loader = other.jinja_loader = FragmentLoader(other.jinja_loader)
+    Fragments().init_app(other)
+
+    assert other.jinja_loader is loader
+    assert isinstance(other.extensions["template_fragments"], Fragments)
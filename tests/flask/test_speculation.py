@@ -0,0 +1,44 @@
+import time
+
+from flask import Flask, render_template
+
+from template_fragments.jinja import FragmentLoader
+
+loaded = []
+
+
+class CountingLoader(FragmentLoader):
+    def get_source(self, environment, path):
+        loaded.append(path)
+        return super().get_source(environment, path)
+
+
+app = Flask(__name__)
+app.jinja_loader = CountingLoader(app.jinja_loader, speculative_workers=2)
+
+
+@app.route("/")
+def get_index():
+    return render_template("index.html", listing=[], content=["foo"])
+
+
+@app.route("/item")
+def get_item():
+    return render_template("index.html#content-item", item="foo")
+
+
+def test_fragments_are_compiled_ahead():
+    client = app.test_client()
+    assert client.get("/").status_code == 200
+
+    deadline = time.monotonic() + 10
+    while app.jinja_loader.queue_depth and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert app.jinja_loader.queue_depth == 0
+    del loaded[:]
+
+    for _ in range(2):
+        assert client.get("/item").text.strip() == "<div>foo</div>"
+
+    assert "index.html#content-item" not in loaded
@@ -0,0 +1,41 @@
+import gzip
+
+from flask import Flask
+
+from template_fragments.flask import render_static_fragment
+from template_fragments.jinja import FragmentLoader
+
+app = Flask(__name__)
+app.jinja_loader = FragmentLoader(app.jinja_loader)
+
+
+@app.route("/empty")
+def get_empty():
+    return render_static_fragment("static.html#empty")
+
+
+@app.route("/dynamic")
+def get_dynamic():
+    return render_static_fragment("static.html#dynamic")
+
+
+def test_static_fragment():
+    response = app.test_client().get("/empty", headers={"Accept-Encoding": "identity"})
+
+    assert response.text == "<p>Nothing here</p>"
+    assert response.content_encoding is None
+    assert "Accept-Encoding" in response.vary
+    assert response.get_etag()[0]
+
+
+def test_static_fragment_gzip():
+    response = app.test_client().get("/empty", headers={"Accept-Encoding": "gzip"})
+
+    assert response.content_encoding == "gzip"
+    assert gzip.decompress(response.data) == b"<p>Nothing here</p>"
+
+
+def test_dynamic_fragment():
+    response = app.test_client().get("/dynamic")
+
+    assert response.text == "<p></p>"
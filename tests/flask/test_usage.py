@@ -0,0 +1,22 @@
+from flask import Flask, render_template
+
+from template_fragments.jinja import FragmentLoader, UsageProfile
+
+app = Flask(__name__)
+app.jinja_loader = FragmentLoader(app.jinja_loader)
+
+profile = UsageProfile()
+profile.install(app.jinja_env)
+
+
+@app.route("/item")
+def get_item():
+    return render_template("index.html#content-item", item="foo")
+
+
+def test_lookups_are_counted():
+    client = app.test_client()
+    for _ in range(3):
+        assert client.get("/item").status_code == 200
+
+    assert profile.counts == {"index.html#content-item": 3}
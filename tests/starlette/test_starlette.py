@@ -0,0 +1,252 @@
+import asyncio
+import pathlib
+import threading
+
+import jinja2
+import pytest
+
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.templating import Jinja2Templates
+from starlette.testclient import TestClient
+
+from template_fragments.starlette import (
+    FragmentResponse,
+    ProgressiveResponse,
+    install_fragment_loader,
+    render_conditional,
+    render_fragment_diff,
+    render_static_fragment,
+)
+
+self_path = pathlib.Path(__file__).parent.resolve()
+
+listing = ["hello", "world"]
+content = ["foo", "bar", "baz"]
+
+load_threads = []
+
+
+class RecordingLoader(jinja2.FileSystemLoader):
+    def get_source(self, environment, template):
+        load_threads.append(threading.get_ident())
+        return super().get_source(environment, template)
+
+
+templates = Jinja2Templates(
+    env=jinja2.Environment(
+        loader=RecordingLoader(self_path / "templates"),
+        enable_async=True,
+    )
+)
+install_fragment_loader(templates)
+
+
+async def get_index(request):
+    return FragmentResponse(
+        templates, request, "index.html", {"listing": listing, "content": content}
+    )
+
+
+async def get_listing(request):
+    return FragmentResponse(
+        templates, request, "index.html#listing", {"listing": listing}
+    )
+
+
+async def get_content(request):
+    return FragmentResponse(
+        templates, request, "index.html#content", {"content": content}
+    )
+
+
+async def get_item(request):
+    return FragmentResponse(
+        templates, request, "index.html#content-item", request.path_params
+    )
+
+
+async def get_loop_thread(request):
+    return FragmentResponse(
+        templates, request, "index.html#content-item", {"item": threading.get_ident()}
+    )
+
+
+async def get_static(request):
+    return await render_static_fragment(
+        templates, request, f"static.html#{request.path_params['fragment']}"
+    )
+
+
+async def get_conditional(request):
+    async def context():
+        return {"item": "foo"}
+
+    return await render_conditional(
+        templates,
+        request,
+        "index.html#content-item",
+        request.path_params["version"],
+        context,
+    )
+
+
+async def get_diff(request):
+    return await render_fragment_diff(
+        templates,
+        request,
+        "index.html",
+        {"listing": listing, "content": content},
+        fragments=["listing", "content"],
+    )
+
+
+async def get_progressive(request):
+    async def slow_content():
+        await asyncio.sleep(0.05)
+        return content
+
+    return ProgressiveResponse(
+        templates,
+        request,
+        "index.html",
+        {"listing": listing, "content": slow_content()},
+    )
+
+
+app = Starlette(
+    routes=[
+        Route("/", get_index),
+        Route("/listing", get_listing),
+        Route("/content", get_content),
+        Route("/item/{item}", get_item),
+        Route("/loop-thread", get_loop_thread),
+        Route("/static/{fragment}", get_static),
+        Route("/conditional/{version}", get_conditional),
+        Route("/diff", get_diff),
+        Route("/progressive", get_progressive),
+    ]
+)
+
+expected_index = """\
+<body>
+<ul>
+    <li>hello</li>
+    <li>world</li>
+</ul>
+<div>
+    <div>foo</div>
+    <div>bar</div>
+    <div>baz</div>
+</div>
+</body>\
+"""
+
+expected_listing = """
+    <li>hello</li>
+    <li>world</li>\
+"""
+
+expected_content = """\
+<div>
+    <div>foo</div>
+    <div>bar</div>
+    <div>baz</div>
+</div>\
+"""
+
+expected_item = """\
+    <div>foo</div>\
+"""
+
+examples = [
+    ("/", expected_index),
+    ("/listing", expected_listing),
+    ("/content", expected_content),
+    ("/item/foo", expected_item),
+]
+
+
+@pytest.mark.parametrize("route, expected", examples)
+def test_index(route, expected):
+    with TestClient(app) as client:
+        response = client.get(route)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+    assert response.text == expected
+
+
+def test_source_loaded_off_the_event_loop():
+    templates.env.cache.clear()
+    templates.env.loader._fragments.clear()
+    del load_threads[:]
+
+    with TestClient(app) as client:
+        loop_thread = int(client.get("/loop-thread").text.strip()[5:-6])
+        client.get("/listing")
+
+    assert len(load_threads) == 1
+    assert load_threads[0] != loop_thread
+
+
+def test_static_fragment():
+    with TestClient(app) as client:
+        plain = client.get("/static/empty", headers={"Accept-Encoding": "identity"})
+        compressed = client.get(
+            "/static/empty", headers={"Accept-Encoding": "deflate, gzip;q=0.5"}
+        )
+        dynamic = client.get("/static/dynamic")
+
+    assert plain.text == "<p>Nothing here</p>"
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["etag"]
+
+    assert compressed.headers["content-encoding"] == "deflate"
+    assert compressed.text == "<p>Nothing here</p>"
+
+    assert dynamic.text == "<p></p>"
+
+
+def test_conditional():
+    with TestClient(app) as client:
+        response = client.get("/conditional/1")
+        etag = response.headers["etag"]
+        not_modified = client.get("/conditional/1", headers={"If-None-Match": etag})
+        weak = client.get("/conditional/1", headers={"If-None-Match": f"W/{etag}"})
+        modified = client.get("/conditional/2", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.text == "    <div>foo</div>"
+
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+    assert not_modified.content == b""
+    assert weak.status_code == 304
+
+    assert modified.status_code == 200
+    assert modified.headers["etag"] != etag
+
+
+def test_fragment_diff():
+    with TestClient(app) as client:
+        response = client.get("/diff")
+        hashes = response.headers["x-fragment-hashes"]
+        unchanged = client.get("/diff", headers={"X-Fragment-Hashes": hashes})
+
+    assert 'id="listing" hx-swap-oob="innerHTML"' in response.text
+    assert 'id="content" hx-swap-oob="innerHTML"' in response.text
+    assert unchanged.text == ""
+    assert unchanged.headers["x-fragment-hashes"] == hashes
+
+
+def test_progressive():
+    with TestClient(app) as client:
+        response = client.get("/progressive")
+
+    shell, _, chunk = response.text.partition("</body>")
+    assert response.headers["content-type"].startswith("text/html")
+    assert "<li>hello</li>" in shell
+    assert '<template data-fragment-placeholder="content"></template>' in shell
+    assert '<template data-fragment="content"><div>' in chunk
+    assert "<div>baz</div>" in chunk
@@ -0,0 +1,164 @@
+import csv
+import io
+import json
+import pathlib
+
+import pytest
+
+from template_fragments import split_templates
+from template_fragments.__main__ import bundle_templates, main, profile_templates
+
+source = """\
+<body>
+<h1>Übersicht</h1>
+<ul>
+{% fragment listing %}
+    {%- for item in listing %}
+    <li>{{ item }}</li>
+    {%- endfor %}
+{% endfragment %}
+</ul>
+{% fragment content %}
+<div>
+    {%- for item in content %}
+    {% fragment content-item %}
+    <div>{{ item }}</div>
+    {% endfragment %}
+    {%- endfor %}
+</div>
+{% endfragment %}
+</body>
+"""
+
+
+@pytest.fixture
+def template_dir(tmp_path):
+    template_dir = tmp_path / "templates"
+    template_dir.mkdir()
+    (template_dir / "index.html").write_bytes(source.encode("utf-8"))
+    return template_dir
+
+
+def test_profile_templates(template_dir):
+    records = profile_templates(template_dir)
+
+    assert [record["name"] for record in records] == [
+        "index.html",
+        "index.html#listing",
+        "index.html#content",
+        "index.html#content-item",
+    ]
+
+    by_name = {record["name"]: record for record in records}
+    assert by_name["index.html#content-item"]["lines"] == 1
+    assert by_name["index.html#content"]["depth"] == 1
+    assert by_name["index.html"]["compile_time"] is None
+    assert by_name["index.html"]["bytes"] == len(
+        split_templates(source)[""].encode("utf-8")
+    )
+
+
+def test_profile_compile(template_dir):
+    jinja2 = pytest.importorskip("jinja2")
+    records = profile_templates(template_dir, environment=jinja2.Environment())
+
+    assert all(record["compile_time"] >= 0 for record in records)
+    assert all(record["code_size"] > 0 for record in records)
+
+
+def test_profile_json(template_dir, capsys):
+    main(
+        [
+            "profile",
+            str(template_dir),
+            "--format",
+            "json",
+            "--sort",
+            "bytes",
+        ]
+    )
+    records = json.loads(capsys.readouterr().out)
+
+    assert records[0]["name"] == "index.html"
+    assert [r["bytes"] for r in records] == sorted(
+        (r["bytes"] for r in records), reverse=True
+    )
+
+
+def test_profile_csv(template_dir, capsys):
+    main(
+        [
+            "profile",
+            str(template_dir),
+            "--format",
+            "csv",
+            "--no-compile",
+        ]
+    )
+    records = list(csv.DictReader(io.StringIO(capsys.readouterr().out)))
+
+    assert [record["name"] for record in records] == sorted(
+        record["name"] for record in records
+    )
+    assert all(record["compile_time"] == "" for record in records)
+
+
+def test_profile_table(template_dir, capsys):
+    main(["profile", str(template_dir)])
+    lines = capsys.readouterr().out.splitlines()
+
+    assert lines[0].split() == [
+        "name",
+        "bytes",
+        "lines",
+        "depth",
+        "split_time",
+        "compile_time",
+        "code_size",
+    ]
+    assert len(lines) == 5
+
+
+def test_bundle_templates(template_dir):
+    bundle = bundle_templates(template_dir, ["index.html"])
+
+    assert list(bundle) == [
+        "index.html",
+        "index.html#listing",
+        "index.html#content",
+        "index.html#content-item",
+    ]
+    assert bundle["index.html#content-item"] == "    <div>{{ item }}</div>\n"
+
+    minified = bundle_templates(template_dir, ["index.html"], minify=True)
+    assert minified["index.html#content-item"] == "<div>{{ item }}</div>"
+    assert bundle_templates(template_dir).keys() == (
+        bundle_templates(template_dir, ["index*.html"]).keys()
+    )
+    assert "<h1>Übersicht</h1>" in bundle["index.html"]
+
+
+def test_export(template_dir, tmp_path, capsys):
+    main(["export", str(template_dir), "index.html", "--output", str(tmp_path)])
+    path = pathlib.Path(capsys.readouterr().out.strip())
+
+    assert path.parent == tmp_path
+    assert path.name.startswith("fragments.") and path.name.endswith(".json")
+    assert json.loads(path.read_text(encoding="utf-8")) == bundle_templates(
+        template_dir, ["index.html"]
+    )
+
+    main(["export", str(template_dir), "index.html", "--output", str(tmp_path)])
+    assert pathlib.Path(capsys.readouterr().out.strip()) == path
+
+    main(
+        [
+            "export",
+            str(template_dir),
+            "index.html",
+            "--output",
+            str(tmp_path),
+            "--minify",
+        ]
+    )
+    assert pathlib.Path(capsys.readouterr().out.strip()) != path
@@ -0,0 +1,61 @@
+import pytest
+
+from jinja2 import DictLoader, Environment
+
+from template_fragments.jinja import FragmentLoader, fragment_dependencies, lazy_context
+
+source = """\
+<h1>{{ title }}</h1>
+<ul>
+{% for item in items %}
+    {% fragment item %}
+    <li>{{ item.name }} {{ range(3) | list }}</li>
+    {% endfragment %}
+{% endfor %}
+</ul>
+{% fragment footer %}
+{% set year = 2023 %}
+<footer>{{ year }} {{ owner }}</footer>
+{% endfragment %}
+"""
+
+
+@pytest.fixture
+def env():
+    return Environment(loader=FragmentLoader(DictLoader({"page.html": source})))
+
+
+def test_fragment_dependencies(env):
+    assert fragment_dependencies(env, "page.html") == {
+        "": {"title", "items", "owner"},
+        "item": {"item"},
+        "footer": {"owner"},
+    }
+
+
+def test_dependencies_are_cached(env):
+    first = fragment_dependencies(env, "page.html")
+    second = fragment_dependencies(env, "page.html")
+
+    assert first is second
+
+
+def test_lazy_context(env):
+    def fail():
+        raise AssertionError()
+
+    context = lazy_context(
+        env, "page.html#item", item=lambda: {"name": "a"}, items=fail
+    )
+
+    assert context == {"item": {"name": "a"}}
+    assert env.get_template("page.html#item").render(context).strip() == (
+        "<li>a [0, 1, 2]</li>"
+    )
+
+
+def test_requires_fragment_loader():
+    env = Environment(loader=DictLoader({"page.html": source}))
+
+    with pytest.raises(TypeError):
+        fragment_dependencies(env, "page.html")
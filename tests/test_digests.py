@@ -0,0 +1,94 @@
+import hashlib
+
+import jinja2
+import pytest
+
+from template_fragments import StaticFragment, fragment_digests, split_templates
+from template_fragments.jinja import FragmentLoader, fragment_etag
+
+source = """\
+<ul>
+{% fragment row %}
+<li>{{ row }}</li>
+{% endfragment %}
+</ul>
+{% fragment empty %}
+{% endfragment %}
+"""
+
+
+def test_digests_match_split_sources():
+    digests = fragment_digests(source)
+    fragments = split_templates(source)
+
+    assert digests.keys() == fragments.keys()
+    for fragment, fragment_source in fragments.items():
+        expected = hashlib.blake2b(
+            fragment_source.encode("utf-8"), digest_size=16
+        ).hexdigest()
+        assert digests[fragment] == expected
+
+    assert digests["row"] == StaticFragment(fragments["row"]).digest
+
+
+@pytest.mark.parametrize("inline_includes", [False, True])
+def test_loader_digest(inline_includes):
+    templates = {"page.html": source}
+    env = jinja2.Environment(
+        loader=FragmentLoader(
+            jinja2.DictLoader(templates), inline_includes=inline_includes
+        )
+    )
+
+    digest = env.loader.digest(env, "page.html#row")
+    assert digest == fragment_digests(source)["row"]
+    assert env.loader.digest(env, "page.html#row") == digest
+    assert env.loader.digest(env, "page.html#missing") == (
+        hashlib.blake2b(b"", digest_size=16).hexdigest()
+    )
+
+    etag = fragment_etag(env, "page.html#row", 1)
+    assert etag == fragment_etag(env, "page.html#row", 1)
+    assert etag != fragment_etag(env, "page.html#row", 2)
+
+    templates["page.html"] = source.replace("<li>", "<li class='row'>")
+    assert env.loader.digest(env, "page.html#row") != digest
+    assert (
+        env.loader.digest(env, "page.html#empty") == fragment_digests(source)["empty"]
+    )
+
+
+@pytest.mark.parametrize("inline_includes", [False, True])
+def test_referenced_templates_change_the_digest(inline_includes):
+    templates = {
+        "base.html": "<main>\n{% block content %}\n{% endblock %}\n</main>\n",
+        "parts.html": source,
+        "page.html": (
+            '{% extends "base.html" %}\n'
+            "{% block content %}\n"
+            '{% include "parts.html#row" %}\n'
+            "{% endblock %}\n"
+        ),
+    }
+    env = jinja2.Environment(
+        loader=FragmentLoader(
+            jinja2.DictLoader(templates), inline_includes=inline_includes
+        )
+    )
+
+    digest = env.loader.digest(env, "page.html")
+    assert digest == env.loader.digest(env, "page.html")
+
+    templates["base.html"] = templates["base.html"].replace("<main>", "<main id='a'>")
+    changed_base = env.loader.digest(env, "page.html")
+    assert changed_base != digest
+
+    templates["parts.html"] = source.replace("<li>", "<li class='row'>")
+    assert env.loader.digest(env, "page.html") != changed_base
+
+
+def test_reference_cycles_are_ignored():
+    templates = {"page.html": '{% include "page.html" %}'}
+    env = jinja2.Environment(loader=FragmentLoader(jinja2.DictLoader(templates)))
+
+    assert env.loader.digest(env, "page.html")
@@ -0,0 +1,42 @@
+import pytest
+
+from template_fragments import (
+    TemplateFragmentError,
+    filter_template,
+    filter_templates,
+    split_templates,
+)
+
+source = """\
+<body>
+{% fragment a %}
+<a>
+{% fragment b %}
+<b>
+{% endfragment %}
+{% endfragment %}
+{% fragment c d %}
+<cd>
+{% endfragment %}
+{% fragment-block e %}
+<e>
+{% endfragment-block %}
+</body>
+"""
+
+
+def test_matches_filter_template():
+    names = ["a", "b", "d", "e", ""]
+    actual = filter_templates(source, names)
+
+    assert actual == {name: filter_template(source, name) for name in names}
+    assert actual == {name: split_templates(source)[name] for name in names}
+
+
+def test_minify():
+    assert filter_templates(source, ["a"], minify=True) == {"a": "<a>\n<b>"}
+
+
+def test_missing_fragments():
+    with pytest.raises(TemplateFragmentError, match="Unknown fragments: x, y"):
+        filter_templates(source, ["a", "y", "x"])
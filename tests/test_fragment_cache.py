@@ -0,0 +1,81 @@
+import jinja2
+
+from template_fragments.jinja import FragmentCache, FragmentLoader
+
+source = """\
+<ul>
+{% fragment row %}
+<li>{{ row }}</li>
+{% endfragment %}
+</ul>
+"""
+
+templates = {f"page{idx}.html": source for idx in range(10)}
+
+
+def make_env(cache):
+    env = jinja2.Environment(loader=FragmentLoader(jinja2.DictLoader(templates)))
+    env.cache = cache
+    return env
+
+
+def test_hits_and_misses():
+    cache = FragmentCache()
+    env = make_env(cache)
+
+    assert env.get_template("page0.html#row").render(row="a") == "<li>a</li>"
+    assert env.get_template("page0.html#row").render(row="b") == "<li>b</li>"
+    env.get_template("page0.html")
+
+    assert cache.hits == 1
+    assert cache.misses == 2
+    assert len(cache) == 2
+    assert len(cache._groups) == 1
+    assert cache.size > 0
+
+
+def test_groups_are_evicted_together():
+    cache = FragmentCache()
+    env = make_env(cache)
+    env.get_template("page0.html")
+    env.get_template("page0.html#row")
+    cache.max_size = cache.size
+
+    env.get_template("page1.html")
+    assert cache.rejections == 1
+    assert [key[1] for key in cache] == ["page0.html", "page0.html#row"]
+
+    env.get_template("page1.html")
+    assert cache.evictions == 2
+    assert [key[1] for key in cache] == ["page1.html"]
+
+
+def test_frequently_used_groups_are_kept():
+    cache = FragmentCache()
+    env = make_env(cache)
+    for _ in range(5):
+        env.get_template("page0.html#row")
+
+    cache.max_size = cache.size
+
+    for idx in range(1, 10):
+        env.get_template(f"page{idx}.html#row")
+
+    assert [key[1] for key in cache] == ["page0.html#row"]
+    assert cache.rejections == 9
+    assert cache.evictions == 0
+
+
+def test_clear_and_overlay():
+    cache = FragmentCache()
+    env = make_env(cache)
+    env.get_template("page0.html")
+
+    overlay = env.overlay(trim_blocks=True)
+    assert overlay.get_template("page0.html#row").render(row="a") == "<li>a</li>"
+
+    assert cache.copy().size == cache.size
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.size == 0
@@ -0,0 +1,119 @@
+import jinja2
+
+from template_fragments import fragment_parents
+
+from template_fragments.jinja import (
+    FragmentLoader,
+    RenderCache,
+    format_fragment_hashes,
+    parse_fragment_hashes,
+    render_changed_fragments,
+)
+
+source = """\
+<body>
+<span id="count">
+{% fragment count %}
+{{ count }}
+{% endfragment %}
+</span>
+<span id="user-name">
+{% fragment user %}
+{{ user }}
+{% endfragment %}
+</span>
+</body>
+"""
+
+env = jinja2.Environment(
+    loader=FragmentLoader(jinja2.DictLoader({"page.html": source}))
+)
+
+
+def test_only_changed_fragments_are_sent():
+    body, hashes = render_changed_fragments(
+        env, "page.html", {"count": 1, "user": "alice"}
+    )
+    assert body == (
+        '<div id="count" hx-swap-oob="innerHTML">1</div>\n'
+        '<div id="user" hx-swap-oob="innerHTML">alice</div>'
+    )
+    assert hashes.keys() == {"count", "user"}
+
+    body, new_hashes = render_changed_fragments(
+        env,
+        "page.html",
+        {"count": 2, "user": "alice"},
+        hashes,
+        targets={"user": "user-name"},
+    )
+    assert body == '<div id="count" hx-swap-oob="innerHTML">2</div>'
+    assert new_hashes["user"] == hashes["user"]
+    assert new_hashes["count"] != hashes["count"]
+
+    body, _ = render_changed_fragments(
+        env, "page.html", {"count": 2, "user": "bob"}, new_hashes, fragments=["count"]
+    )
+    assert body == ""
+
+
+def test_cached_outputs():
+    cache = RenderCache()
+    context = {"count": 1, "user": "alice"}
+
+    _, hashes = render_changed_fragments(env, "page.html", context, cache=cache)
+    body, cached_hashes = render_changed_fragments(
+        env, "page.html", context, hashes, cache=cache
+    )
+
+    assert body == ""
+    assert cached_hashes == hashes
+    assert len(cache._entries) == 2
+
+
+def test_header_round_trip():
+    hashes = {"count": "abc", "user": "def"}
+
+    assert parse_fragment_hashes(format_fragment_hashes(hashes)) == hashes
+    assert parse_fragment_hashes(" count=abc , invalid,") == {"count": "abc"}
+    assert parse_fragment_hashes("") == {}
+
+
+def test_nested_fragments_are_not_compared_by_default():
+    nested = """\
+<ul id="rows">
+{% fragment rows %}
+{% for row in rows %}
+{% fragment row %}
+<li>{{ row }}</li>
+{% endfragment %}
+{% endfor %}
+{% endfragment %}
+</ul>
+"""
+    env = jinja2.Environment(
+        loader=FragmentLoader(jinja2.DictLoader({"page.html": nested}))
+    )
+
+    assert fragment_parents(nested) == {"rows": set(), "row": {"rows"}}
+
+    _, hashes = render_changed_fragments(env, "page.html", {"rows": ["a", "b"]})
+    assert hashes.keys() == {"rows"}
+
+
+def test_parents_reuse_the_loaded_source():
+    calls = []
+
+    class CountingLoader(jinja2.DictLoader):
+        def get_source(self, environment, template):
+            calls.append(template)
+            return super().get_source(environment, template)
+
+    env = jinja2.Environment(
+        loader=FragmentLoader(CountingLoader({"page.html": source}))
+    )
+
+    render_changed_fragments(env, "page.html", {"count": 1, "user": "alice"})
+    render_changed_fragments(env, "page.html", {"count": 2, "user": "alice"})
+
+    assert calls == ["page.html"]
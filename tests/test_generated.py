@@ -1,6 +1,11 @@
 import pytest
 
-from template_fragments import split_templates, filter_template
+from template_fragments import (
+    TemplateFragmentError,
+    filter_template,
+    filter_templates,
+    split_templates,
+)
 
 
 def concat(*p: str) -> str:
@@ -14,12 +19,22 @@ def test_reentrant_fragment():
         "{% endfragment %}\n",
         "{% endfragment %}\n",
     )
-    with pytest.raises(Exception):
+    with pytest.raises(
+        TemplateFragmentError, match="Reentrant fragments: .* in line 2"
+    ):
         filter_template(template, "")
-    with pytest.raises(Exception):
+    with pytest.raises(
+        TemplateFragmentError, match="Reentrant fragments: .* in line 2"
+    ):
         filter_template(template, "dummy")
-    with pytest.raises(Exception):
+    with pytest.raises(
+        TemplateFragmentError, match="Reentrant fragments: .* in line 2"
+    ):
         split_templates(template)
+    with pytest.raises(
+        TemplateFragmentError, match="Reentrant fragments: .* in line 2"
+    ):
+        filter_templates(template, ["", "dummy"])
 
 
 def test_missing_name():
@@ -27,12 +42,26 @@ def test_missing_name():
         "{% fragment %}\n",
         "{% endfragment %}\n",
     )
-    with pytest.raises(Exception):
+    with pytest.raises(
+        TemplateFragmentError,
+        match="fragment start tag without fragment names in line 1",
+    ):
         filter_template(template, "")
-    with pytest.raises(Exception):
+    with pytest.raises(
+        TemplateFragmentError,
+        match="fragment start tag without fragment names in line 1",
+    ):
         filter_template(template, "dummy")
-    with pytest.raises(Exception):
+    with pytest.raises(
+        TemplateFragmentError,
+        match="fragment start tag without fragment names in line 1",
+    ):
         split_templates(template)
+    with pytest.raises(
+        TemplateFragmentError,
+        match="fragment start tag without fragment names in line 1",
+    ):
+        filter_templates(template, [""])
 
 
 def test_named_end():
@@ -40,24 +69,36 @@ def test_named_end():
         "{% fragment dummy %}\n",
         "{% endfragment dummy %}\n",
     )
-    with pytest.raises(Exception):
+    with pytest.raises(
+        TemplateFragmentError, match="fragment end tag with fragment names in line 2"
+    ):
         filter_template(template, "")
-    with pytest.raises(Exception):
+    with pytest.raises(
+        TemplateFragmentError, match="fragment end tag with fragment names in line 2"
+    ):
         filter_template(template, "dummy")
-    with pytest.raises(Exception):
+    with pytest.raises(
+        TemplateFragmentError, match="fragment end tag with fragment names in line 2"
+    ):
         split_templates(template)
+    with pytest.raises(
+        TemplateFragmentError, match="fragment end tag with fragment names in line 2"
+    ):
+        filter_templates(template, ["", "dummy"])
 
 
 def test_missing_end():
     template = concat(
         "{% fragment example %}\n",
     )
-    with pytest.raises(Exception):
+    with pytest.raises(TemplateFragmentError, match="Unbalanced fragments in line 2"):
         filter_template(template, "")
-    with pytest.raises(Exception):
+    with pytest.raises(TemplateFragmentError, match="Unbalanced fragments in line 2"):
         filter_template(template, "dummy")
-    with pytest.raises(Exception):
+    with pytest.raises(TemplateFragmentError, match="Unbalanced fragments in line 2"):
         split_templates(template)
+    with pytest.raises(TemplateFragmentError, match="Unbalanced fragments in line 2"):
+        filter_templates(template, ["", "example"])
 
 
 def test_repeated_ends():
@@ -66,12 +107,14 @@ def test_repeated_ends():
         "{% endfragment %}\n",
         "{% endfragment %}\n",
     )
-    with pytest.raises(Exception):
+    with pytest.raises(TemplateFragmentError, match="Unbalanced fragments in line 3"):
         filter_template(template, "")
-    with pytest.raises(Exception):
+    with pytest.raises(TemplateFragmentError, match="Unbalanced fragments in line 3"):
         filter_template(template, "dummy")
-    with pytest.raises(Exception):
+    with pytest.raises(TemplateFragmentError, match="Unbalanced fragments in line 3"):
         split_templates(template)
+    with pytest.raises(TemplateFragmentError, match="Unbalanced fragments in line 3"):
+        filter_templates(template, ["", "example"])
 
 
 def test_trailing_content():
@@ -79,12 +122,22 @@ def test_trailing_content():
         "{% fragment example %} invalid\n",
         "{% endfragment %}\n",
     )
-    with pytest.raises(Exception):
+    with pytest.raises(
+        TemplateFragmentError, match="Content around a fragment tag in line 1"
+    ):
         filter_template(template, "")
-    with pytest.raises(Exception):
+    with pytest.raises(
+        TemplateFragmentError, match="Content around a fragment tag in line 1"
+    ):
         filter_template(template, "dummy")
-    with pytest.raises(Exception):
+    with pytest.raises(
+        TemplateFragmentError, match="Content around a fragment tag in line 1"
+    ):
         split_templates(template)
+    with pytest.raises(
+        TemplateFragmentError, match="Content around a fragment tag in line 1"
+    ):
+        filter_templates(template, ["", "example"])
 
 
 def test_example_1():
@@ -144,6 +197,7 @@ def test_example_1():
     assert filter_template(template, "content") == expected["content"]
     assert filter_template(template, "content-item") == expected["content-item"]
     assert split_templates(template) == expected
+    assert filter_templates(template, expected) == expected
 
 
 def test_example_2():
@@ -177,6 +231,7 @@ def test_example_2():
     assert filter_template(template, "") == expected[""]
     assert filter_template(template, "item") == expected["item"]
     assert split_templates(template) == expected
+    assert filter_templates(template, expected) == expected
 
 
 def test_block_fragments():
@@ -214,6 +269,7 @@ def test_block_fragments():
     assert filter_template(template, "") == expected[""]
     assert filter_template(template, "item") == expected["item"]
     assert split_templates(template) == expected
+    assert filter_templates(template, expected) == expected
 
 
 def test_nested_block_fragments():
@@ -267,6 +323,7 @@ def test_nested_block_fragments():
     assert filter_template(template, "item") == expected["item"]
     assert filter_template(template, "outer") == expected["outer"]
     assert split_templates(template) == expected
+    assert filter_templates(template, expected) == expected
 
 
 def test_repeated_fragment():
@@ -300,3 +357,4 @@ def test_repeated_fragment():
     assert filter_template(template, "foo") == expected["foo"]
     assert filter_template(template, "bar") == expected["bar"]
     assert split_templates(template) == expected
+    assert filter_templates(template, expected) == expected
@@ -0,0 +1,128 @@
+import pytest
+
+from jinja2 import DictLoader, Environment
+
+from template_fragments.jinja import FragmentLoader
+
+templates = {
+    "page.html": """\
+<ul>
+{% for item in items %}
+    {% include "parts.html#row" %}
+    {% include "parts.html#cell" %}
+{% endfor %}
+</ul>
+{% include "parts.html#footer" %}
+<small>
+    {%- include "parts.html#copyright" -%}
+</small>
+{% include target %}
+""",
+    "parts.html": """\
+{% fragment row %}
+{% set label = item | upper %}
+<li>{{ label }}</li>
+{% endfragment %}
+{% fragment footer %}
+<footer>
+{% include "parts.html#copyright" %}
+</footer>
+{% endfragment %}
+{% fragment copyright %}
+(c) {{ owner }}
+{% endfragment %}
+{% fragment cell %}
+    {% if item %}
+    <tr>{{ item }}</tr>
+    {% endif %}
+{% endfragment %}
+""",
+    "dynamic.html": "<p>dynamic</p>",
+    "tree.html": """\
+{% fragment node %}
+<li>{{ node.name }}
+{% for child in node.children %}
+{% with node = child %}
+{% include "tree.html#node" %}
+{% endwith %}
+{% endfor %}
+</li>
+{% endfragment %}
+""",
+    "blocks.html": """\
+{% include "parts.html#block" %}
+""",
+}
+templates["parts.html"] += """\
+{% fragment-block block %}
+block
+{% endfragment-block %}
+"""
+
+context = {"items": ["a", "b"], "owner": "me", "target": "dynamic.html"}
+
+
+@pytest.mark.parametrize("trim_blocks", [False, True])
+@pytest.mark.parametrize("lstrip_blocks", [False, True])
+def test_same_output(trim_blocks, lstrip_blocks):
+    def render(inline_includes):
+        env = Environment(
+            loader=FragmentLoader(
+                DictLoader(templates), inline_includes=inline_includes
+            ),
+            trim_blocks=trim_blocks,
+            lstrip_blocks=lstrip_blocks,
+        )
+        return env.get_template("page.html").render(context)
+
+    assert render(True) == render(False)
+
+
+def test_includes_are_inlined():
+    env = Environment()
+    loader = FragmentLoader(DictLoader(templates), inline_includes=True)
+    source, _, _ = loader.get_source(env, "page.html")
+
+    assert "parts.html" not in source
+    assert "(c) {{ owner }}" in source
+    assert "{% include target %}" in source
+
+
+def test_unsupported_targets_are_kept():
+    env = Environment()
+    loader = FragmentLoader(DictLoader(templates), inline_includes=True)
+    source, _, _ = loader.get_source(env, "blocks.html")
+
+    assert source == templates["blocks.html"]
+
+
+def test_cycles_are_kept():
+    tree = {
+        "name": "a",
+        "children": [{"name": "b", "children": [{"name": "c", "children": []}]}],
+    }
+
+    def render(inline_includes):
+        env = Environment(
+            loader=FragmentLoader(
+                DictLoader(templates), inline_includes=inline_includes
+            )
+        )
+        return env.get_template("tree.html#node").render(node=tree)
+
+    env = Environment()
+    loader = FragmentLoader(DictLoader(templates), inline_includes=True)
+    source, _, _ = loader.get_source(env, "tree.html#node")
+
+    assert '{% include "tree.html#node" %}' in source
+    assert render(True) == render(False)
+    assert "<li>c" in render(True)
+
+
+def test_uptodate_tracks_included_templates():
+    sources = dict(templates)
+    env = Environment(loader=FragmentLoader(DictLoader(sources), inline_includes=True))
+    assert "(c) me" in env.get_template("page.html").render(context)
+
+    sources["parts.html"] = sources["parts.html"].replace("(c)", "(C)")
+    assert "(C) me" in env.get_template("page.html").render(context)
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import time
+
+import jinja2
+
+from template_fragments.jinja import FragmentLoader, LatencyHistogram, instrument
+
+source = """\
+<ul>
+{% fragment row %}
+<li>{{ row }}{{ sleep() }}</li>
+{% endfragment %}
+</ul>
+"""
+
+
+def make_env(**kwargs):
+    env = jinja2.Environment(
+        loader=FragmentLoader(jinja2.DictLoader({"page.html": source})), **kwargs
+    )
+    env.globals["sleep"] = lambda seconds=0: time.sleep(seconds) or ""
+    return env
+
+
+def test_renders_are_recorded_per_fragment():
+    env = make_env()
+    env.get_template("page.html")
+    stats = instrument(env, threshold=None)
+
+    for _ in range(3):
+        env.get_template("page.html#row").render(row="a")
+
+    assert "".join(env.get_template("page.html").generate(row="b")).startswith("<ul>")
+
+    snapshot = stats.snapshot()
+    assert snapshot.keys() == {"page.html", "page.html#row"}
+    assert snapshot["page.html#row"]["count"] == 3
+    assert snapshot["page.html"]["count"] == 1
+    assert 0 <= snapshot["page.html#row"]["min"] <= snapshot["page.html#row"]["p50"]
+    assert snapshot["page.html#row"]["p99"] <= snapshot["page.html#row"]["max"]
+
+    stats.clear()
+    assert stats.snapshot() == {}
+
+
+def test_async_renders_are_recorded_once():
+    env = make_env(enable_async=True)
+    stats = instrument(env, threshold=None)
+    template = env.get_template("page.html#row")
+
+    assert template.render(row="a") == "<li>a</li>"
+    assert asyncio.run(template.render_async(row="a")) == "<li>a</li>"
+
+    assert stats.snapshot()["page.html#row"]["count"] == 2
+
+
+def test_slow_renders_are_logged(caplog):
+    env = make_env()
+    env.globals["sleep"] = lambda: time.sleep(0.02) or ""
+    instrument(env, threshold=0.01, logger=logging.getLogger("test"))
+
+    with caplog.at_level(logging.WARNING, logger="test"):
+        env.get_template("page.html#row").render(row="abc")
+
+    (record,) = caplog.records
+    assert record.getMessage().startswith("Slow render of page.html#row: ")
+    assert record.getMessage().endswith(", 12 characters")
+
+
+def test_histogram_quantiles():
+    histogram = LatencyHistogram()
+    for value in range(1, 1001):
+        histogram.record(value)
+
+    assert histogram.count == 1000
+    assert histogram.min == 1
+    assert histogram.max == 1000
+    assert 500 <= histogram.quantile(0.5) <= 500 * 1.07
+    assert 990 <= histogram.quantile(0.99) <= 1000
+    assert len(histogram.buckets) < 150
+    assert LatencyHistogram().quantile(0.5) is None
@@ -0,0 +1,42 @@
+import jinja2
+
+from template_fragments.jinja import FragmentLoader
+
+source = """\
+<ul>
+{% fragment row %}
+<li>{{ version }}</li>
+{% endfragment %}
+</ul>
+"""
+
+
+def test_templates_without_uptodate_are_reloaded():
+    sources = {"page.html": source.replace("{{ version }}", "v1")}
+    env = jinja2.Environment(
+        loader=FragmentLoader(jinja2.FunctionLoader(sources.get)), cache_size=0
+    )
+    assert env.get_template("page.html#row").render() == "<li>v1</li>"
+
+    sources["page.html"] = source.replace("{{ version }}", "v3")
+    assert env.get_template("page.html#row").render() == "<li>v3</li>"
+    assert not env.loader.has_fragments("page.html")
+
+
+def test_split_templates_are_bounded():
+    loads = []
+
+    def load(name):
+        loads.append(name)
+        return source, name, lambda: True
+
+    env = jinja2.Environment(
+        loader=FragmentLoader(jinja2.FunctionLoader(load), cache_size=2), cache_size=0
+    )
+    for name in ["a.html", "b.html", "a.html", "c.html", "a.html", "b.html"]:
+        env.get_template(f"{name}#row")
+
+    assert loads == ["a.html", "b.html", "c.html", "b.html"]
+    assert env.loader.has_fragments("a.html")
+    assert env.loader.has_fragments("b.html")
+    assert not env.loader.has_fragments("c.html")
@@ -0,0 +1,70 @@
+from jinja2 import DictLoader, Environment
+
+from template_fragments import filter_template, minify_template, split_templates
+from template_fragments.jinja import FragmentLoader
+
+source = """\
+<body>
+    <ul>
+    {% fragment listing %}
+        {% for item in listing %}
+
+        <li>{{ item }}</li>    <li>-</li>
+        {% endfor %}
+    {% endfragment %}
+    </ul>
+    {% fragment code %}
+        <pre>
+  indented
+        </pre>
+        <script>
+            let x = 1;
+
+        </script>
+    {% endfragment %}
+</body>
+"""
+
+expected_listing = """\
+{% for item in listing %}
+<li>{{ item }}</li> <li>-</li>
+{% endfor %}"""
+
+expected_code = """\
+<pre>
+  indented
+        </pre>
+<script>
+            let x = 1;
+
+        </script>"""
+
+
+def test_filter_template():
+    assert filter_template(source, "listing", minify=True) == expected_listing
+    assert filter_template(source, "code", minify=True) == expected_code
+
+
+def test_split_templates():
+    actual = split_templates(source, minify=True)
+
+    assert actual["listing"] == expected_listing
+    assert actual["code"] == expected_code
+    assert actual[""].startswith("<body>\n    <ul>\n        {% for item in listing %}")
+
+
+def test_minify_template():
+    assert minify_template("") == ""
+    assert minify_template("  <a>\n\n    <b>\n") == "<a>\n  <b>"
+    assert minify_template("<p><pre>a</pre></p>\n  <b>") == "<p><pre>a</pre></p>\n  <b>"
+
+
+def test_fragment_loader():
+    env = Environment(
+        loader=FragmentLoader(DictLoader({"a.html": source}), minify=True)
+    )
+
+    assert env.loader.get_source(env, "a.html#listing")[0] == expected_listing
+    assert env.get_template("a.html#listing").render(listing=["x"]) == (
+        "\n<li>x</li> <li>-</li>\n"
+    )
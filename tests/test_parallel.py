@@ -0,0 +1,82 @@
+import os
+
+import jinja2
+
+from template_fragments.jinja import (
+    FragmentLoader,
+    fragment_process_pool,
+    render_fragments_parallel,
+)
+
+source = """\
+<body>
+{% fragment sales %}
+<p>{{ sales }}</p>
+{% endfragment %}
+{% fragment costs %}
+<p>{{ costs }}</p>
+{% endfragment %}
+{% fragment pid %}
+<p>{{ pid() }}</p>
+{% endfragment %}
+{% fragment summary %}
+{% include "summary.html" %}
+{% endfragment %}
+</body>
+"""
+
+
+def make_env():
+    env = jinja2.Environment(
+        loader=FragmentLoader(
+            jinja2.DictLoader(
+                {"report.html": source, "summary.html": "<p>{{ total }}</p>"}
+            )
+        )
+    )
+    env.globals["pid"] = os.getpid
+    return env
+
+
+def test_render_in_process():
+    output = render_fragments_parallel(
+        make_env, "report.html", ["costs", "sales"], {"sales": 1, "costs": 2}
+    )
+
+    assert output == "<p>2</p>\n<p>1</p>"
+
+
+def test_render_in_workers():
+    context = {"sales": 1, "costs": 2, "unpicklable": lambda: None}
+    with fragment_process_pool(make_env, max_workers=2) as executor:
+        output = render_fragments_parallel(
+            make_env,
+            "report.html",
+            ["sales", "costs", "pid"],
+            context,
+            executor=executor,
+            min_jobs=1,
+        )
+
+    sales, costs, pid = output.split("\n")
+    assert (sales, costs) == ("<p>1</p>", "<p>2</p>")
+    assert pid != f"<p>{os.getpid()}</p>"
+
+
+def test_included_templates_receive_the_context():
+    context = {"sales": 1, "total": 3}
+    assert render_fragments_parallel(
+        make_env, "report.html", ["sales", "summary"], context
+    ) == ("<p>1</p>\n<p>3</p>")
+
+    with fragment_process_pool(make_env, max_workers=1) as executor:
+        output = render_fragments_parallel(
+            make_env,
+            "report.html",
+            ["summary"],
+            context,
+            executor=executor,
+            min_jobs=1,
+        )
+
+    assert output == "<p>3</p>"
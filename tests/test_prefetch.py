@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import time
+
+import jinja2
+
+from template_fragments.jinja import FragmentLoader
+
+source = """\
+<ul>
+{% fragment row %}
+<li>{{ row }}</li>
+{% endfragment %}
+</ul>
+"""
+
+
+class SlowLoader(jinja2.DictLoader):
+    def __init__(self, mapping):
+        super().__init__(mapping)
+        self.active = 0
+        self.max_active = 0
+        self.loads = []
+        self._lock = threading.Lock()
+
+    def get_source(self, environment, template):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.active, self.max_active)
+            self.loads.append(template)
+
+        try:
+            time.sleep(0.02)
+            return super().get_source(environment, template)
+
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def test_prefetch():
+    base_loader = SlowLoader({f"page{idx}.html": source for idx in range(8)})
+    env = jinja2.Environment(loader=FragmentLoader(base_loader))
+    names = [f"page{idx}.html#row" for idx in range(8)] + ["missing.html"]
+
+    loaded = asyncio.run(env.loader.prefetch(env, names, concurrency=3))
+
+    assert loaded == [f"page{idx}.html" for idx in range(8)]
+    assert 1 < base_loader.max_active <= 3
+
+    del base_loader.loads[:]
+    assert env.get_template("page3.html#row").render(row="a") == "<li>a</li>"
+    assert env.get_template("page3.html").render(row="a").startswith("<ul>")
+    assert base_loader.loads == []
+
+    assert asyncio.run(env.loader.prefetch(env, ["page0.html"])) == []
@@ -0,0 +1,126 @@
+import threading
+
+import jinja2
+
+from template_fragments import SplitRegistry
+from template_fragments.jinja import FragmentLoader
+
+source = """\
+<div>
+{% fragment item %}
+<p>{{ item }}</p>
+{% endfragment %}
+</div>
+"""
+
+
+def make_env(path, registry):
+    return jinja2.Environment(
+        loader=FragmentLoader(jinja2.FileSystemLoader(path), registry=registry)
+    )
+
+
+def test_environments_share_splits(tmp_path):
+    (tmp_path / "index.html").write_text(source)
+    registry = SplitRegistry()
+
+    first = make_env(tmp_path, registry)
+    second = make_env(tmp_path, registry)
+
+    assert first.get_template("index.html#item").render(item="a") == "<p>a</p>"
+    assert second.get_template("index.html#item").render(item="b") == "<p>b</p>"
+    assert registry.misses == 1
+    assert registry.hits == 1
+
+
+def test_changed_sources_are_split_again(tmp_path):
+    registry = SplitRegistry()
+
+    assert registry.split(str(tmp_path / "index.html"), source)["item"]
+    assert registry.split(str(tmp_path / "index.html"), source + "\n")["item"]
+    assert registry.split(str(tmp_path / "index.html"), source, minify=True)["item"]
+    assert registry.misses == 3
+
+    key = registry.key(str(tmp_path / "index.html"), source, minify=True)
+    assert key in registry
+    assert registry.split_key(key, source, minify=True) is registry.get(key)
+
+
+def test_least_recently_used_templates_are_evicted():
+    registry = SplitRegistry(max_size=4 * len(source))
+
+    registry.split("a.html", source)
+    registry.split("b.html", source)
+    registry.split("a.html", source)
+    registry.split("c.html", source)
+
+    assert registry.size <= registry.max_size
+    assert registry.hits == 1
+
+    registry.split("a.html", source)
+    registry.split("b.html", source)
+    assert registry.hits == 2
+    assert registry.misses == 4
+
+
+def test_concurrent_splits_run_once():
+    registry = SplitRegistry()
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        registry.split("index.html", source)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert registry.misses == 1
+    assert registry.hits == 7
+
+
+def test_size_matches_entries_under_concurrency():
+    registry = SplitRegistry(max_size=3 * len(source))
+    barrier = threading.Barrier(8)
+
+    def worker(idx):
+        barrier.wait()
+        for n in range(20):
+            registry.split(f"{(idx + n) % 5}.html", source)
+
+    threads = [threading.Thread(target=worker, args=(idx,)) for idx in range(8)]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    expected = sum(
+        len(source) + sum(len(fragment) for fragment in fragments.values())
+        for fragments, source in registry._entries.values()
+    )
+    assert registry.size == expected
+    assert registry.size <= registry.max_size
+    assert not registry._pending
+
+
+def test_loader_relies_on_registry(tmp_path):
+    for name in ["a.html", "b.html", "c.html"]:
+        (tmp_path / name).write_text(source.replace("item", name[0]))
+
+    registry = SplitRegistry(max_size=2 * len(source))
+    env = make_env(tmp_path, registry)
+
+    for _ in range(2):
+        for name in ["a.html", "b.html", "c.html"]:
+            assert env.get_template(f"{name}#{name[0]}").render(**{name[0]: 1}) == (
+                "<p>1</p>"
+            )
+            env.cache.clear()
+
+    assert registry.size <= registry.max_size
+    assert all(entry[0] is None for entry in env.loader._fragments.values())
+    assert registry.misses == 6
@@ -0,0 +1,148 @@
+import threading
+import time
+
+import pytest
+
+from jinja2 import DictLoader, Environment
+
+import template_fragments.jinja
+from template_fragments.jinja import FragmentLoader, RenderCache, render_fragment_cached
+
+source = """\
+<body>
+{% fragment nav %}
+<nav>{{ user }} {{ counter.next() }}</nav>
+{% endfragment %}
+</body>
+"""
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def next(self):
+        self.value += 1
+        return self.value
+
+
+@pytest.fixture
+def env():
+    templates = {"page.html": source}
+    env = Environment(loader=FragmentLoader(DictLoader(templates)))
+    env.globals["counter"] = Counter()
+    env.globals["templates"] = templates
+    return env
+
+
+def test_outputs_are_reused(env):
+    first = render_fragment_cached(env, "page.html#nav", {"user": "alice"})
+    second = render_fragment_cached(env, "page.html#nav", {"user": "alice"})
+    other = render_fragment_cached(env, "page.html#nav", {"user": "bob"})
+
+    assert first == second == "<nav>alice 1</nav>"
+    assert other == "<nav>bob 2</nav>"
+
+
+def test_explicit_key(env):
+    first = render_fragment_cached(env, "page.html#nav", {"user": ["a"]}, key="a")
+    second = render_fragment_cached(env, "page.html#nav", {"user": ["b"]}, key="a")
+
+    assert first == second
+
+    with pytest.raises(TypeError):
+        render_fragment_cached(env, "page.html#nav", {"user": ["a"]})
+
+
+def test_ttl(env, monkeypatch):
+    now = 0.0
+    monkeypatch.setattr("time.monotonic", lambda: now)
+
+    cache = RenderCache(ttl=10)
+    assert cache.render(env, "page.html#nav", {"user": "a"}) == "<nav>a 1</nav>"
+
+    now = 5.0
+    assert cache.render(env, "page.html#nav", {"user": "a"}) == "<nav>a 1</nav>"
+
+    now = 11.0
+    assert cache.render(env, "page.html#nav", {"user": "a"}) == "<nav>a 2</nav>"
+
+
+def test_size_bound(env):
+    cache = RenderCache(max_size=2 * len("<nav>a 1</nav>"))
+
+    for user in ["a", "b", "c"]:
+        cache.render(env, "page.html#nav", {"user": user})
+
+    assert cache.size <= cache.max_size
+    assert len(cache._entries) == 2
+    assert cache.render(env, "page.html#nav", {"user": "a"}) == "<nav>a 4</nav>"
+
+
+def test_size_counts_bytes(env):
+    cache = RenderCache()
+    cache.render(env, "page.html#nav", {"user": "\u00e9"})
+
+    assert cache.size == len("<nav>\u00e9 1</nav>".encode("utf-8"))
+
+
+def test_default_cache_is_created_once(env, monkeypatch):
+    created = []
+
+    class SlowCache(RenderCache):
+        def __init__(self):
+            created.append(self)
+            time.sleep(0.01)
+            super().__init__()
+
+    monkeypatch.setattr(template_fragments.jinja, "RenderCache", SlowCache)
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        render_fragment_cached(env, "page.html#nav", {"user": "alice"})
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert created == [env.fragment_render_cache]
+
+
+def test_invalidated_on_reload(env):
+    cache = RenderCache()
+    assert cache.render(env, "page.html#nav", {"user": "a"}) == "<nav>a 1</nav>"
+
+    env.globals["templates"]["page.html"] = source.replace("<nav>", "<nav>!")
+    assert cache.render(env, "page.html#nav", {"user": "a"}) == "<nav>!a 2</nav>"
+
+
+def test_value_types_are_part_of_the_key(env):
+    outputs = [
+        render_fragment_cached(env, "page.html#nav", {"user": user})
+        for user in [1, True, 1.0, 1]
+    ]
+
+    assert outputs == [
+        "<nav>1 1</nav>",
+        "<nav>True 2</nav>",
+        "<nav>1.0 3</nav>",
+        "<nav>1 1</nav>",
+    ]
+
+
+def test_without_template_cache():
+    templates = {"page.html": source}
+    env = Environment(loader=FragmentLoader(DictLoader(templates)), cache_size=0)
+    env.globals["counter"] = Counter()
+
+    first = render_fragment_cached(env, "page.html#nav", {"user": "alice"})
+    second = render_fragment_cached(env, "page.html#nav", {"user": "alice"})
+    assert first == second == "<nav>alice 1</nav>"
+
+    templates["page.html"] = source.replace("<nav>", "<nav class='main'>")
+    third = render_fragment_cached(env, "page.html#nav", {"user": "alice"})
+    assert third == "<nav class='main'>alice 2</nav>"
@@ -0,0 +1,71 @@
+import jinja2
+import pytest
+
+from template_fragments.jinja import FragmentLoader, render_fragment
+
+source = """\
+<body>
+{% fragment-block header %}
+<h1>{{ title }}</h1>
+{% block subtitle %}
+<h2>{{ subtitle }}</h2>
+{% endblock %}
+{% endfragment-block %}
+{% fragment items %}
+{% block items %}
+{{ items }}
+{% endblock %}
+{% block other %}
+{% endblock %}
+{% endfragment %}
+</body>
+"""
+
+
+def make_env(**kwargs):
+    return jinja2.Environment(
+        loader=FragmentLoader(jinja2.DictLoader({"page.html": source})), **kwargs
+    )
+
+
+def test_fragment_blocks_use_the_parent_template():
+    env = make_env()
+
+    assert env.loader.get_fragment_blocks(env, "page.html") == {"header"}
+    assert render_fragment(
+        env, "page.html#header", {"title": "a", "subtitle": "b"}
+    ) == ("\n<h1>a</h1>\n\n<h2>b</h2>\n\n")
+    assert [key[1] for key in env.cache] == ["page.html"]
+
+
+def test_other_fragments_are_rendered_separately():
+    env = make_env()
+
+    assert render_fragment(env, "page.html#items", {"items": 3}) == "\n3\n\n\n"
+    assert render_fragment(env, "page.html", {"title": "a"}).startswith("<body>")
+    assert sorted(key[1] for key in env.cache) == ["page.html", "page.html#items"]
+
+
+def test_output_matches_the_filtered_template():
+    env = make_env()
+    context = {"title": "a", "subtitle": "b"}
+
+    assert render_fragment(env, "page.html#header", context).strip() == (
+        env.get_template("page.html#header").render(context).strip()
+    )
+
+
+def test_errors_are_reported_as_for_templates():
+    env = make_env(undefined=jinja2.StrictUndefined)
+
+    with pytest.raises(jinja2.UndefinedError):
+        render_fragment(env, "page.html#header", {"title": "a"})
+
+
+def test_async_environments_are_rendered_separately():
+    env = make_env(enable_async=True)
+
+    assert render_fragment(env, "page.html#header", {"title": "a"}).strip() == (
+        "<h1>a</h1>\n\n<h2></h2>"
+    )
+    assert "page.html#header" in [key[1] for key in env.cache]
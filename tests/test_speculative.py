@@ -0,0 +1,94 @@
+import time
+
+import jinja2
+
+from template_fragments.jinja import FragmentLoader
+
+source = """\
+<ul>
+{% fragment row %}
+<li>{{ row }}</li>
+{% endfragment %}
+</ul>
+{% fragment filters %}
+<input value="{{ query }}">
+{% endfragment %}
+"""
+
+
+def make_env(**kwargs):
+    return jinja2.Environment(
+        loader=FragmentLoader(
+            jinja2.DictLoader({"page.html": source, "other.html": source}), **kwargs
+        )
+    )
+
+
+def wait_for(loader):
+    deadline = time.monotonic() + 10
+    while loader.queue_depth and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert loader.queue_depth == 0
+
+
+def test_fragments_are_compiled_after_the_base_template():
+    env = make_env(speculative_workers=2)
+    env.get_template("page.html").render(row="a", query="q")
+    wait_for(env.loader)
+
+    assert env.get_template("page.html#row").render(row="a") == "<li>a</li>"
+    assert env.get_template("page.html#filters").render(query="q") == (
+        '<input value="q">'
+    )
+    assert env.loader.speculative_hits == 2
+    assert env.loader.speculative_hit_rate == 1.0
+
+    assert env.get_template("other.html#row").render(row="b") == "<li>b</li>"
+    assert env.loader.speculative_misses == 1
+    assert env.loader.speculative_hit_rate == 2 / 3
+
+
+def test_stale_compilations_are_not_used():
+    sources = {"page.html": source}
+    env = jinja2.Environment(
+        loader=FragmentLoader(jinja2.DictLoader(sources), speculative_workers=1),
+        auto_reload=True,
+    )
+    env.get_template("page.html")
+    wait_for(env.loader)
+
+    sources["page.html"] = source.replace("<li>", "<li class='row'>")
+
+    assert env.get_template("page.html#row").render(row="a") == (
+        "<li class='row'>a</li>"
+    )
+    assert env.loader.speculative_misses == 1
+
+
+def test_compilations_of_old_versions_are_dropped():
+    sources = {"page.html": source}
+    env = jinja2.Environment(
+        loader=FragmentLoader(jinja2.DictLoader(sources), speculative_workers=1),
+        auto_reload=True,
+    )
+
+    for idx in range(20):
+        sources["page.html"] = source.replace("<li>", f"<li data-idx='{idx}'>")
+        env.get_template("page.html")
+        wait_for(env.loader)
+
+    assert sorted(env.loader._compiled) == ["page.html#filters", "page.html#row"]
+    assert env.get_template("page.html#row").render(row="a") == (
+        "<li data-idx='19'>a</li>"
+    )
+    assert env.loader.speculative_hits == 1
+
+
+def test_disabled_by_default():
+    env = make_env()
+    env.get_template("page.html")
+
+    assert env.loader.queue_depth == 0
+    assert env.get_template("page.html#row").render(row="a") == "<li>a</li>"
+    assert env.loader.speculative_hit_rate == 0.0
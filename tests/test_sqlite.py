@@ -0,0 +1,76 @@
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from jinja2 import Environment, TemplateNotFound
+
+from template_fragments.jinja import FragmentStoreLoader
+from template_fragments.sqlite import FragmentStore
+
+source = """\
+<ul>
+{% for item in items %}
+    {% fragment item %}
+    <li>{{ item }}</li>
+    {% endfragment %}
+{% endfor %}
+</ul>
+"""
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FragmentStore(tmp_path / "fragments.sqlite")
+
+
+def test_publish_and_get(store):
+    assert store.publish({"page.html": source}) == {"page.html": 1}
+
+    assert store.get("page.html", "item") == ("    <li>{{ item }}</li>\n", 1)
+    assert store.get("page.html", "missing") == ("", 1)
+    assert store.get("missing.html") is None
+    assert store.list_templates() == ["page.html"]
+
+
+def test_versions(store):
+    store.publish({"page.html": source})
+    assert store.publish({"page.html": source}) == {"page.html": 1}
+    assert store.publish({"page.html": source.replace("li", "p")}) == {"page.html": 2}
+
+    assert store.version("page.html") == 2
+    assert store.get("page.html", "item") == ("    <p>{{ item }}</p>\n", 2)
+
+    conn = store._connection()
+    assert conn.execute("SELECT DISTINCT version FROM fragments").fetchall() == [(2,)]
+
+
+def test_threads(store):
+    store.publish({"page.html": source})
+    results = []
+
+    thread = threading.Thread(target=lambda: results.append(store.get("page.html")))
+    thread.start()
+    thread.join()
+
+    assert results == [store.get("page.html")]
+
+
+def test_loader(store):
+    store.publish({"page.html": source})
+    env = Environment(loader=FragmentStoreLoader(store))
+
+    assert env.get_template("page.html#item").render(item="a") == "    <li>a</li>"
+
+    store.publish({"page.html": source.replace("li", "p")})
+    assert env.get_template("page.html#item").render(item="a") == "    <p>a</p>"
+
+    with pytest.raises(TemplateNotFound):
+        env.get_template("missing.html")
+
+
+def test_jinja_integration_does_not_import_sqlite():
+    code = "import sys, template_fragments.jinja; print('sqlite3' in sys.modules)"
+    output = subprocess.check_output([sys.executable, "-c", code], text=True)
+    assert output.strip() == "False"
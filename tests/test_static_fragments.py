@@ -0,0 +1,60 @@
+import gzip
+import zlib
+
+from jinja2 import DictLoader, Environment
+
+from template_fragments import StaticFragment, is_static_template
+from template_fragments.jinja import FragmentLoader
+
+source = """\
+<main>
+{% fragment empty %}
+<p>Nothing here</p>
+{% endfragment %}
+{% fragment dynamic %}
+<p>{{ message }}</p>
+{% endfragment %}
+{% fragment commented %}
+{# comment #}
+{% endfragment %}
+</main>
+"""
+
+
+def test_is_static_template():
+    assert is_static_template("<p>hello</p>")
+    assert not is_static_template("<p>{{ hello }}</p>")
+    assert not is_static_template("{% if x %}{% endif %}")
+    assert not is_static_template("{# comment #}")
+    assert not is_static_template("<% x %>", markers=["<%"])
+
+
+def test_static_fragment():
+    static = StaticFragment("<p>hello</p>")
+
+    assert static.body == b"<p>hello</p>"
+    assert gzip.decompress(static.encoded["gzip"]) == static.body
+    assert zlib.decompress(static.encoded["deflate"]) == static.body
+    assert static.digest == StaticFragment("<p>hello</p>").digest
+    assert static.digest != StaticFragment("<p>world</p>").digest
+
+
+def test_loader_flags_static_fragments():
+    env = Environment(loader=FragmentLoader(DictLoader({"page.html": source})))
+    static = env.loader.get_static_fragments(env, "page.html")
+
+    assert set(static) == {"empty"}
+    assert env.loader.get_static(env, "page.html#dynamic") is None
+    assert env.loader.get_static(env, "page.html#empty") is static["empty"]
+
+
+def test_static_body_matches_rendered_output():
+    for keep_trailing_newline in [False, True]:
+        env = Environment(
+            loader=FragmentLoader(DictLoader({"page.html": source})),
+            keep_trailing_newline=keep_trailing_newline,
+        )
+        static = env.loader.get_static(env, "page.html#empty")
+        rendered = env.get_template("page.html#empty").render()
+
+        assert static.body == rendered.encode()
@@ -0,0 +1,157 @@
+import asyncio
+
+import jinja2
+import pytest
+
+from template_fragments import TemplateFragmentError, replace_fragments
+from template_fragments.jinja import FragmentLoader, stream_fragments
+
+source = """\
+<body>
+<h1>{{ title }}</h1>
+{% fragment sidebar %}
+<aside>{{ sidebar }}</aside>
+{% endfragment %}
+{% fragment main %}
+<main>{{ main }}</main>
+{% endfragment %}
+</body>
+"""
+
+
+def make_env(**kwargs):
+    return jinja2.Environment(
+        loader=FragmentLoader(jinja2.DictLoader({"page.html": source})), **kwargs
+    )
+
+
+async def later(value, delay):
+    await asyncio.sleep(delay)
+    return value
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_replace_fragments():
+    assert replace_fragments(source, {"main": "[main]"}) == (
+        "<body>\n"
+        "<h1>{{ title }}</h1>\n"
+        "<aside>{{ sidebar }}</aside>\n"
+        "[main]\n"
+        "</body>\n"
+    )
+
+
+@pytest.mark.parametrize("enable_async", [False, True])
+def test_fragments_are_streamed_when_ready(enable_async):
+    env = make_env(enable_async=enable_async)
+    context = {
+        "title": "Title",
+        "sidebar": later("slow", 0.05),
+        "main": later("fast", 0.0),
+    }
+
+    shell, script, first, second = asyncio.run(
+        collect(stream_fragments(env, "page.html", context))
+    )
+
+    assert shell == (
+        "<body>\n"
+        "<h1>Title</h1>\n"
+        '<template data-fragment-placeholder="sidebar"></template>\n'
+        '<template data-fragment-placeholder="main"></template>\n'
+        "</body>"
+    )
+    assert "function __swapFragment" in script
+    assert first == (
+        '<template data-fragment="main"><main>fast</main></template>'
+        '<script>__swapFragment("main")</script>'
+    )
+    assert second.startswith('<template data-fragment="sidebar"><aside>slow</aside>')
+
+
+def test_awaitables_referenced_by_the_shell_are_awaited_first():
+    env = make_env()
+    context = {"title": later("Title", 0.0), "sidebar": "sidebar", "main": "main"}
+
+    (page,) = asyncio.run(collect(stream_fragments(env, "page.html", context)))
+
+    assert "<h1>Title</h1>" in page
+    assert "<aside>sidebar</aside>" in page
+
+
+def test_explicit_fragments():
+    env = make_env()
+    context = {"title": "Title", "sidebar": "sidebar", "main": "main"}
+
+    chunks = asyncio.run(
+        collect(stream_fragments(env, "page.html", context, fragments=["main"]))
+    )
+
+    assert "<aside>sidebar</aside>" in chunks[0]
+    assert chunks[2].startswith('<template data-fragment="main"><main>main</main>')
+
+
+nested_source = """\
+<body>
+{% fragment sidebar %}
+<ul>
+{% for item in items %}
+{% fragment item %}
+<li>{{ item }}</li>
+{% endfragment %}
+{% endfor %}
+</ul>
+{% endfragment %}
+</body>
+"""
+
+
+def test_nested_fragments_are_streamed_with_their_parent():
+    env = jinja2.Environment(
+        loader=FragmentLoader(jinja2.DictLoader({"page.html": nested_source}))
+    )
+    context = {"items": later(["a", "b"], 0)}
+
+    chunks = asyncio.run(collect(stream_fragments(env, "page.html", context)))
+
+    assert chunks[0].count("data-fragment-placeholder") == 1
+    assert len(chunks) == 3
+    assert chunks[2].startswith('<template data-fragment="sidebar">')
+    assert "<li>a</li>" in chunks[2]
+
+
+def test_nested_explicit_fragments_are_rejected():
+    env = jinja2.Environment(
+        loader=FragmentLoader(jinja2.DictLoader({"page.html": nested_source}))
+    )
+
+    with pytest.raises(TemplateFragmentError):
+        asyncio.run(
+            collect(
+                stream_fragments(
+                    env, "page.html", {"items": []}, fragments=["sidebar", "item"]
+                )
+            )
+        )
+
+
+def test_shells_reuse_the_loaded_source():
+    calls = []
+
+    class CountingLoader(jinja2.DictLoader):
+        def get_source(self, environment, template):
+            calls.append(template)
+            return super().get_source(environment, template)
+
+    env = jinja2.Environment(
+        loader=FragmentLoader(CountingLoader({"page.html": source}))
+    )
+    shell, _ = env.loader.get_shell(env, "page.html", ["main"])
+    env.loader.get_shell(env, "page.html", ["sidebar"])
+
+    assert "<aside>" in shell.render(sidebar="")
+
+    assert calls == ["page.html"]
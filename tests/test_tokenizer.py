@@ -0,0 +1,65 @@
+import random
+import re
+import time
+
+import pytest
+
+from template_fragments import TemplateFragmentError, split_templates
+from template_fragments._base import match_fragment_tag
+
+reference = re.compile(
+    r"(?P<head>[^\{]*)\{%\s+(?P<tag>[^\s]+)(?P<data>[^%]+)%\}(?P<tail>.*)"
+)
+
+
+def reference_match(s):
+    m = reference.match(s)
+    return None if m is None else m.group("head", "tag", "data", "tail")
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "",
+        "{% fragment a b %}",
+        "  {% endfragment %}  ",
+        "{%fragment a %}",
+        "{% fragment%}",
+        "{% a%b%} tail",
+        "{% a%%}",
+        "{% %}",
+        "x {% if a %} y",
+        "{{ a }} {% b %}",
+        "{% a } %} b %}",
+    ],
+)
+def test_examples(line):
+    assert match_fragment_tag(line) == reference_match(line)
+
+
+def test_random_lines():
+    rng = random.Random(42)
+    for _ in range(20_000):
+        line = "".join(rng.choice("{%} a\tb") for _ in range(rng.randint(0, 16)))
+        if rng.random() < 0.5:
+            line = "{% " + line
+
+        assert match_fragment_tag(line) == reference_match(line), repr(line)
+
+
+@pytest.mark.parametrize("pattern", ["a", "a%", "%", "%%}", "{%", "a ", "{"])
+def test_pathological_lines(pattern):
+    line = "{% " + pattern * 500_000
+
+    start = time.perf_counter()
+    match_fragment_tag(line)
+    assert time.perf_counter() - start < 2.0
+
+
+def test_errors_are_kept():
+    with pytest.raises(TemplateFragmentError):
+        split_templates("{% fragment a %} tail\n{% endfragment %}\n")
+
+    assert split_templates("{% " + "a" * 100_000 + "\n") == {
+        "": "{% " + "a" * 100_000 + "\n"
+    }
@@ -0,0 +1,82 @@
+import jinja2
+
+from template_fragments.jinja import FragmentLoader, UsageProfile, warmup
+
+source = """\
+<ul>
+{% fragment row %}
+<li>{{ row }}</li>
+{% endfragment %}
+</ul>
+"""
+
+
+def make_env(profile=None, **kwargs):
+    env = jinja2.Environment(
+        loader=FragmentLoader(
+            jinja2.DictLoader({"page.html": source, "other.html": source})
+        ),
+        **kwargs,
+    )
+    if profile is not None:
+        profile.install(env)
+
+    return env
+
+
+def test_record_and_replay(tmp_path):
+    profile = UsageProfile()
+    env = make_env(profile, cache_size=0)
+
+    for name in ["page.html#row", "page.html#row", "other.html", "page.html#row"]:
+        env.get_template(name)
+
+    assert profile.counts == {"page.html#row": 3, "other.html": 1}
+
+    profile.save(tmp_path / "profile.json")
+    restored = UsageProfile.load(tmp_path / "profile.json")
+    assert restored.hottest() == ["page.html#row", "other.html"]
+    assert restored.hottest(1) == ["page.html#row"]
+
+    env = make_env()
+    assert warmup(env, tmp_path / "profile.json", top=1) == ["page.html#row"]
+    assert len(env.cache) == 1
+
+
+def test_cached_templates_are_counted():
+    profile = UsageProfile()
+    env = make_env(profile)
+
+    for _ in range(1000):
+        env.get_template("page.html#row").render(row="a")
+
+    env.get_template("other.html")
+
+    assert profile.counts == {"page.html#row": 1000, "other.html": 1}
+    assert len(env.cache) == 2
+
+    env.cache.clear()
+    env.get_template("page.html#row")
+    assert profile.counts["page.html#row"] == 1001
+
+    profile.install(env)
+    env.get_template("page.html#row")
+    assert profile.counts["page.html#row"] == 1002
+
+
+def test_warmup_skips_unknown_names():
+    env = make_env()
+    profile = UsageProfile({"missing.html#row": 10, "page.html": 2})
+
+    assert warmup(env, profile) == ["page.html"]
+
+
+def test_warmup_budget():
+    env = make_env()
+    profile = UsageProfile({"page.html": 2, "other.html": 1})
+
+    assert warmup(env, profile, budget=0) == ["page.html"]
+
+
+def test_missing_profile_is_empty(tmp_path):
+    assert UsageProfile.load(tmp_path / "missing.json").counts == {}
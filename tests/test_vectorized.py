@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+import template_fragments._base
+from template_fragments import (
+    TemplateFragmentError,
+    filter_template,
+    filter_templates,
+    split_templates,
+)
+
+pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def vectorize(monkeypatch):
+    def vectorize(enabled):
+        threshold = 0 if enabled else float("inf")
+        monkeypatch.setattr(template_fragments._base, "vectorize_threshold", threshold)
+
+    return vectorize
+
+
+def random_template(rng):
+    lines = []
+    stack = []
+    for _ in range(rng.randint(0, 60)):
+        choice = rng.random()
+        if choice < 0.15:
+            name = rng.choice("abcdef")
+            if name not in stack:
+                stack.append(name)
+                lines.append(f"  {{% fragment {name} %}}")
+
+        elif choice < 0.25 and stack:
+            stack.pop()
+            lines.append("{% endfragment %}")
+
+        elif choice < 0.35:
+            lines.append("{% for x in items %}")
+
+        else:
+            lines.append(rng.choice(["<p>{{ x }}</p>", "", "  äöü ✓", "{ % }", "x\r"]))
+
+    lines.extend("{% endfragment %}" for _ in stack)
+    return "\n".join(lines) + rng.choice(["", "\n"])
+
+
+def split_both(vectorize, func, *args):
+    res = []
+    for enabled in [False, True]:
+        vectorize(enabled)
+        try:
+            res.append(func(*args))
+
+        except TemplateFragmentError as exc:
+            res.append(("error", str(exc)))
+
+    return res
+
+
+def test_random_templates(vectorize):
+    rng = random.Random(13)
+    for _ in range(500):
+        src = random_template(rng)
+
+        expected, actual = split_both(vectorize, split_templates, src)
+        assert actual == expected
+
+        expected, actual = split_both(vectorize, filter_template, src, "a")
+        assert actual == expected
+
+        expected, actual = split_both(vectorize, filter_templates, src, [""])
+        assert actual == expected
+
+
+@pytest.mark.parametrize(
+    "src",
+    [
+        "",
+        "\n",
+        "{% fragment a %}\n{% endfragment %}",
+        "{% fragment a %}\n<p>\n",
+        "{% endfragment %}\n",
+        "{% fragment a %}\n{% fragment a %}\n{% endfragment %}\n{% endfragment %}",
+        "<p>\n  {% fragment-block a %}\n  ✓\n  {% endfragment-block %}\n</p>\n",
+        "x {% fragment a %}\n",
+    ],
+)
+def test_examples(vectorize, src):
+    expected, actual = split_both(vectorize, split_templates, src)
+    assert actual == expected
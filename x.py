@@ -42,6 +42,11 @@ def test(backtrace):
     )
 
 
+@cmd()
+def bench():
+    python("benchmarks/bench_tokenizer.py")
+
+
 @cmd()
 def update_docs():
     print(":: update Readme.md")